@@ -0,0 +1,245 @@
+from moravec import (THRESHOLD, convert_image_to_matrix, edges_from_mask, load_image_memmap, moravec,
+                     moravec_response, moravec_streaming, moravec_sweep, moravec_window, save_edge_map, save_edge_mask,
+                     threshold_response, write_edges_to_file)
+from PIL import Image
+import numpy as np
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Default settings.
+# WARNING: The largest images need several GB of memory, the reference loop is only run on small images.
+SIZES = [256, 512, 1024, 2048, 4096, 8192]
+WINDOW_SIZES = [3, 5, 7, 9, 11]
+WINDOW_SHAPES = ["star", "square", "circle"]
+ENGINES = ["numpy", "parallel", "loop", "legacy"]
+# The reference loop (and the legacy loop) takes minutes per image, it is only timed when selected with --engines.
+DEFAULT_ENGINES = ["numpy", "parallel"]
+# Largest number of pixels processed by the reference loop in the timing benchmark.
+LOOP_MAX_PIXELS = 256 * 256
+
+def synthetic_image(size, seed = 0):
+    '''
+    Generates a grayscale test image with blocks of random intensity and noise (many corners).
+
+        Parameters:
+            size (int): Size of the image (size x size).
+            seed (int): Seed of the random generator. DEFAULT = 0
+
+        Returns:
+            image_matrix (array): Image matrix (uint8).
+    '''
+
+    rng = np.random.default_rng(seed)
+
+    # Upsample random blocks to get flat areas with sharp corners between them
+    blocks = rng.integers(0, 256, size=(-(-size // 16), -(-size // 16)), dtype=np.uint8)
+    image_matrix = np.repeat(np.repeat(blocks, 16, axis=0), 16, axis=1)[:size, :size]
+    noise = rng.integers(-8, 9, size=(size, size), dtype=np.int16)
+    return np.clip(image_matrix + noise, 0, 255).astype(np.uint8)
+
+def measure(function, *args, **kwargs):
+    '''
+    Measures wall time and peak memory allocated by a function call.
+    Memory allocated by worker processes is not included.
+
+        Parameters:
+            function (function): Measured function.
+            args, kwargs: Arguments of the function.
+
+        Returns:
+            result, seconds, peak (tuple): Result of the call, wall time in seconds and peak memory in bytes.
+    '''
+
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    try:
+        result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return result, seconds, peak
+
+def record(results, name, size, window_size, seconds, peak, pixels):
+    '''Appends a benchmark record to results and prints it.'''
+
+    entry = {"benchmark": name, "size": size, "window_size": window_size, "seconds": round(seconds, 6),
+             "pixels_per_second": round(pixels / seconds) if seconds else None, "peak_mb": round(peak / 2**20, 2)}
+    results.append(entry)
+    print(f"{name:<24} {size:>6} {str(window_size or '-'):>3} {seconds:>10.4f} s "
+          f"{entry['pixels_per_second'] or 0:>14,} px/s {entry['peak_mb']:>10.2f} MB")
+
+def benchmark(sizes = SIZES, window_sizes = WINDOW_SIZES, engines = DEFAULT_ENGINES, workers = None):
+    '''
+    Benchmarks moravec engines, convert_image_to_matrix, write_edges_to_file and save_edge_map
+    on synthetic images.
+
+        Parameters:
+            sizes (list): Sizes of the synthetic images. DEFAULT = SIZES
+            window_sizes (list): Sizes of the convolution window. DEFAULT = WINDOW_SIZES
+            engines (list): Engines of moravec to benchmark. DEFAULT = DEFAULT_ENGINES
+            workers (int): Number of processes of the parallel engine. DEFAULT = None (number of processors)
+
+        Returns:
+            results (list): List of benchmark records.
+    '''
+
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for size in sizes:
+            pixels = size * size
+            image_matrix = synthetic_image(size)
+            path = os.path.join(tmpdir, f"synthetic_{size}.tif")
+            Image.fromarray(image_matrix).save(path)
+
+            _, seconds, peak = measure(convert_image_to_matrix, path)
+            record(results, "convert_image_to_matrix", size, None, seconds, peak, pixels)
+            _, seconds, peak = measure(convert_image_to_matrix, path, "uint8")
+            record(results, "convert (uint8)", size, None, seconds, peak, pixels)
+
+            for window_size in window_sizes:
+                for engine in engines:
+
+                    # The reference loop takes minutes even on medium images
+                    if engine in ("loop", "legacy") and pixels > LOOP_MAX_PIXELS:
+                        continue
+
+                    legacy_matrix = image_matrix.astype("int64")
+                    _, seconds, peak = measure(moravec, legacy_matrix, THRESHOLD, window_size, engine, workers)
+                    record(results, f"moravec ({engine})", size, window_size, seconds, peak, pixels)
+
+                response, seconds, peak = measure(moravec_response, image_matrix, window_size)
+                record(results, "moravec_response", size, window_size, seconds, peak, pixels)
+
+                edges = edges_from_mask(threshold_response(response, THRESHOLD), window_size)
+
+                for fmt in ("npy", "raw", "npz", "csv"):
+                    _, seconds, peak = measure(write_edges_to_file, edges, os.path.join(tmpdir, "edges"), fmt)
+                    record(results, f"write_edges ({fmt})", size, window_size, seconds, peak, pixels)
+
+                _, seconds, peak = measure(save_edge_map, legacy_matrix, window_size, os.path.join(tmpdir, "edge_map"))
+                record(results, "save_edge_map", size, window_size, seconds, peak, pixels)
+                _, seconds, peak = measure(save_edge_mask, threshold_response(response, THRESHOLD), os.path.join(tmpdir, "edge_mask"))
+                record(results, "save_edge_mask", size, window_size, seconds, peak, pixels)
+
+    return results
+
+def check_engines(img, window_sizes = WINDOW_SIZES, crop = 160, workers = None):
+    '''
+    Checks that every engine returns the same edges and edge map as the reference loop.
+
+        Parameters:
+            img (str): Source image.
+            window_sizes (list): Sizes of the convolution window. DEFAULT = WINDOW_SIZES
+            crop (int): Size of the central part of the image used for the comparison,
+                        0 uses the whole image (slow for large windows). DEFAULT = 160
+            workers (int): Number of processes of the parallel engine. DEFAULT = None (number of processors)
+
+        Returns:
+            mismatches (list): Descriptions of engines that differ from the reference loop.
+    '''
+
+    image_matrix = convert_image_to_matrix(img)
+
+    if crop:
+        top = max((image_matrix.shape[0] - crop) // 2, 0)
+        left = max((image_matrix.shape[1] - crop) // 2, 0)
+        image_matrix = image_matrix[top:top + crop, left:left + crop]
+
+    compact_matrix = image_matrix.astype("uint8")
+    mismatches = []
+    sweep = moravec_sweep(compact_matrix, [THRESHOLD], window_sizes)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source = os.path.join(tmpdir, "source.npy")
+        np.save(source, compact_matrix)
+
+        for window_size in window_sizes:
+            margin = window_size - 1
+            reference_matrix = image_matrix.copy()
+            reference = sorted(moravec(reference_matrix, THRESHOLD, window_size, "loop"))
+            reference_mask = reference_matrix[margin:reference_matrix.shape[0] - margin, margin:reference_matrix.shape[1] - margin] == 4000
+            candidates = {}
+
+            for engine in ("numpy", "parallel"):
+                engine_matrix = image_matrix.copy()
+                edges = sorted(moravec(engine_matrix, THRESHOLD, window_size, engine, workers))
+                candidates[f"moravec ({engine})"] = (edges, engine_matrix[margin:engine_matrix.shape[0] - margin, margin:engine_matrix.shape[1] - margin] == 4000)
+
+            mask = threshold_response(moravec_response(compact_matrix, window_size), THRESHOLD)
+            candidates["moravec_response"] = (edges_from_mask(mask, window_size).tolist(), mask)
+            candidates["moravec_sweep"] = (edges_from_mask(sweep[(window_size, THRESHOLD)], window_size).tolist(), sweep[(window_size, THRESHOLD)])
+
+            moravec_streaming(load_image_memmap(source), THRESHOLD, window_size, os.path.join(tmpdir, "edges"),
+                              os.path.join(tmpdir, "edge_map"), tile_size=max(crop // 3, 16) if crop else 128)
+            candidates["moravec_streaming"] = (np.load(os.path.join(tmpdir, "edges.npy")).tolist(),
+                                               np.load(os.path.join(tmpdir, "edge_map.npy")) == 255)
+
+            for name, (edges, edge_mask) in candidates.items():
+                matches = edges == reference and np.array_equal(edge_mask, reference_mask)
+                print(f"{name:<24} window {window_size:>2}: {'OK' if matches else 'MISMATCH'} ({len(reference)} edges)")
+
+                if not matches:
+                    mismatches.append(f"{name} (window size {window_size})")
+
+            # Float images (e.g. .npy files) scaled to [0, 1) have to give the same response up to the scale
+            for shape in WINDOW_SHAPES:
+                window = moravec_window(window_size, shape)
+                expected = moravec_response(compact_matrix, window).astype("float64")
+                scaled = moravec_response(compact_matrix / 255, window) * 255**2
+                matches = np.allclose(scaled, expected)
+                print(f"{'float (' + shape + ')':<24} window {window_size:>2}: {'OK' if matches else 'MISMATCH'}")
+
+                if not matches:
+                    mismatches.append(f"float {shape} window (window size {window_size})")
+
+    return mismatches
+
+def main(argv = None):
+    '''
+    Command line interface running the correctness check and the benchmark.
+
+        Parameters:
+            argv (list): Command line arguments. DEFAULT = None (sys.argv)
+
+        Returns:
+            status (int): 0 if all engines match the reference loop, 1 otherwise.
+    '''
+
+    parser = argparse.ArgumentParser(description="Benchmark and regression check of the Moravec edge detector.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="sizes of the synthetic images")
+    parser.add_argument("--window-sizes", type=int, nargs="+", default=WINDOW_SIZES, help="sizes of the convolution window")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=DEFAULT_ENGINES, help="engines of moravec to benchmark")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of processes of the parallel engine")
+    parser.add_argument("--image", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "lena.tif"),
+                        help="image used for the correctness check (default: lena.tif)")
+    parser.add_argument("--crop", type=int, default=160, help="size of the image part compared with the reference loop, 0 = whole image")
+    parser.add_argument("--check-only", action="store_true", help="only compare the engines with the reference loop")
+    parser.add_argument("--json", help="file the benchmark records are written to")
+    args = parser.parse_args(argv)
+
+    mismatches = check_engines(args.image, args.window_sizes, args.crop, args.workers)
+
+    if mismatches:
+        print("Engines differing from the reference loop: " + ", ".join(mismatches), file=sys.stderr)
+        return 1
+
+    if not args.check_only:
+        results = benchmark(args.sizes, args.window_sizes, args.engines, args.workers)
+
+        if args.json:
+            with open(args.json, "w") as out:
+                json.dump(results, out, indent=2)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,15 @@
 from PIL import Image, ImageOps
 import numpy as np
-from math import inf
+from math import inf, isqrt
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from multiprocessing import shared_memory
+import argparse
 import csv
+import functools
+import glob
+import os
+import struct
 import sys
 
 # Default settings.
@@ -10,6 +18,12 @@ import sys
 # WARNING: Setting window_size to a high value will lead to decreased performance.
 THRESHOLD = 3500    
 WINDOW_SIZE = 3
+# (Optional) Set TILE_SIZE to a lower value to decrease memory usage of the streaming mode.
+TILE_SIZE = 1024
+# Extensions of images found in directories passed to the command line interface.
+IMAGE_EXTENSIONS = (".tif", ".tiff", ".png", ".jpg", ".jpeg", ".bmp")
+# Extensions of the edge point formats ("raw" stores little-endian int32 (row, column) pairs without header).
+EDGE_EXTENSIONS = {"npy": ".npy", "raw": ".bin", "npz": ".npz", "packed": ".npz", "csv": ".csv"}
 
 def generate_vectors(size):
     '''
@@ -49,13 +63,13 @@ def generate_vectors(size):
         base_vector_list.extend(new_vector_list)
         return base_vector_list
     
-    # If the selected window size is less than 3, terminate script 
+    # If the selected window size is less than 3, raise an error
     elif int(size) <= 3:
-        sys.exit("The size of the window has to be at least 3.")
+        raise ValueError("The size of the window has to be at least 3.")
 
-    # If the size input is not convertible to int or is an even number, terminate script
+    # If the size input is an even number, raise an error
     else:
-        sys.exit("The size of the window has to be an odd number (at least 3).")
+        raise ValueError("The size of the window has to be an odd number (at least 3).")
 
 def create_convolution_window(vector_list):
     '''
@@ -70,12 +84,88 @@ def create_convolution_window(vector_list):
     window = vector_list + [[0,0]]
     return window
 
-def convert_image_to_matrix(img):
+# Precomputed window specification (see moravec_window)
+MoravecWindow = namedtuple("MoravecWindow", ["shape", "size", "radius", "shifts", "offsets", "shift_radius", "margin"])
+
+def moravec_window(size, shape = "star", shifts = "scaled"):
+    '''
+    Creates window specification used in edge computation.
+    The "star" window reproduces the original operator: squared differences are summed over all shifts
+    and the minimum is taken over the pixels of the window.
+    The "square" and "circle" windows use the classic Moravec operator: squared differences are summed over
+    all pixels of the window (using summed-area tables, so the cost does not depend on the window size)
+    and the minimum is taken over all shifts.
+
+        Parameters:
+            size (int): Size of the convolution window (size x size).
+            shape (str): Shape of the window. DEFAULT = "star" OPTIONAL = "square"; "circle"
+            shifts (str or list): Shifts the squared differences are computed for.
+                                  DEFAULT = "scaled" (vectors of generate_vectors) OPTIONAL = "compass"
+                                  (8 neighbouring pixels); list of [column, row] vectors
+
+        Returns:
+            window (MoravecWindow): Window specification with shifts and offsets stored as (n, 2) arrays.
+    '''
+    
+    if not isinstance(shifts, str):
+        shifts = tuple(tuple(int(value) for value in vector) for vector in shifts)
+        
+    return _cached_window(size, shape, shifts)
+
+@functools.lru_cache(maxsize=None)
+def _cached_window(size, shape, shifts):
+    '''Creates window specification once for every combination of parameters (see moravec_window).'''
+    
+    # Validate the window size
+    vector_list = generate_vectors(size)
+    radius = size // 2
+    
+    if shifts == "scaled":
+        shifts = vector_list
+    elif shifts == "compass":
+        shifts = generate_vectors(3)
+    elif isinstance(shifts, str):
+        raise ValueError(f"Unknown shifts {shifts}.")
+    elif len(shifts) == 0 or any(len(vector) != 2 for vector in shifts):
+        raise ValueError("Shifts have to be a non-empty list of [column, row] vectors.")
+    
+    dy, dx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    
+    if shape == "star":
+        offsets = np.array(create_convolution_window(vector_list))
+    elif shape == "square":
+        offsets = np.column_stack((dx.ravel(), dy.ravel()))
+    elif shape == "circle":
+        inside = dx**2 + dy**2 <= radius**2
+        offsets = np.column_stack((dx[inside], dy[inside]))
+    else:
+        raise ValueError(f"Unknown window shape {shape}.")
+    
+    shifts = np.array(shifts, dtype=np.intp).reshape(-1, 2)
+    offsets = offsets.astype(np.intp)
+    shift_radius = int(np.abs(shifts).max())
+    
+    # Arrays are shared by all users of the cached window, so they are made read-only
+    shifts.flags.writeable = False
+    offsets.flags.writeable = False
+    
+    return MoravecWindow(shape, size, radius, shifts, offsets, shift_radius, radius + shift_radius)
+
+def _as_window(window_size):
+    '''Returns the window specification of a window size or the specification itself.'''
+    
+    if isinstance(window_size, MoravecWindow):
+        return window_size
+    
+    return moravec_window(window_size)
+
+def convert_image_to_matrix(img, dtype = "int64"):
     '''
     Converts source image to numpy matrix.
 
         Parameters:
             img (Image object): Source image.
+            dtype (str): Data type of the matrix. Use "uint8" to keep one byte per pixel. DEFAULT = "int64"
 
         Returns:
             image_matrix (array): Image matrix.
@@ -85,25 +175,210 @@ def convert_image_to_matrix(img):
         image = Image.open(img)
         
     except FileNotFoundError:
-        sys.exit(f"The image {img} could not be found.")
+        raise FileNotFoundError(f"The image {img} could not be found.") from None
     
     # Convert image to grayscale
     image = ImageOps.grayscale(image)
-    image_matrix = np.array(image, dtype="int64")
+    image_matrix = np.array(image, dtype=dtype)
     return image_matrix
 
-def write_edges_to_file(edges_list, outfilename):
+def load_image_memmap(img, shape = None, dtype = "uint8"):
     '''
-    Writes computed edges to a csv file.
+    Opens source image as a read-only memory-mapped matrix, so it is not loaded into memory at once.
+    Only .npy and raw files are memory-mapped. Other formats are decoded by PIL as a whole, so their size
+    is limited by the available memory and by PIL's decompression bomb check (Image.MAX_IMAGE_PIXELS).
+    Convert large rasters to .npy or raw files first (e.g. gdal_translate -of ENVI).
 
         Parameters:
-            edges_list (list): List of detected edges.
-            outfilename (str): Name of the output file.
+            img (str): Source image. Either a .npy file, a raw file of grayscale values or an image readable by PIL.
+            shape (tuple): Shape (rows, columns) of a raw file. DEFAULT = None
+            dtype (str): Data type of a raw file. DEFAULT = "uint8"
+
+        Returns:
+            image_matrix (array): Image matrix.
     '''
     
-    with open(f"{outfilename}.csv", 'w', newline = '') as out:
-        csv.writer(out, delimiter = ',').writerow(["row,column"])
-        csv.writer(out, delimiter = ',').writerows(edges_list)
+    try:
+        # NumPy files store their shape and data type, so they can be mapped directly
+        if str(img).endswith(".npy"):
+            return np.load(img, mmap_mode = "r")
+        
+        # Raw files need their shape to be specified
+        if shape is not None:
+            return np.memmap(img, dtype = dtype, mode = "r", shape = tuple(shape))
+        
+        # Other formats have to be decoded by PIL, only the grayscale values are kept (one byte per pixel)
+        image = ImageOps.grayscale(Image.open(img))
+        return np.asarray(image)
+    
+    except FileNotFoundError:
+        raise FileNotFoundError(f"The image {img} could not be found.") from None
+    
+    except Image.DecompressionBombError:
+        raise ValueError(f"The image {img} is too large to be decoded at once, convert it to a .npy or raw file.") from None
+
+def write_edges_to_file(edges_list, outfilename, fmt = "npy"):
+    '''
+    Writes computed edges to a file.
+
+        Parameters:
+            edges_list (list): List or array of detected edges (row, column).
+            outfilename (str): Name of the output file (without extension).
+            fmt (str): Format of the output file.
+                       DEFAULT = "npy" (int32 array) OPTIONAL = "raw" (int32 pairs without header);
+                       "npz" (compressed archive); "csv" (text)
+    '''
+    
+    if fmt == "csv":
+        with open(f"{outfilename}.csv", 'w', newline = '') as out:
+            csv.writer(out, delimiter = ',').writerow(["row", "column"])
+            csv.writer(out, delimiter = ',').writerows(edges_list)
+        return
+    
+    edges = np.asarray(edges_list, dtype="<i4").reshape(-1, 2)
+    
+    if fmt == "npy":
+        np.save(f"{outfilename}.npy", edges)
+        
+    elif fmt == "raw":
+        edges.tofile(f"{outfilename}.bin")
+        
+    elif fmt == "npz":
+        np.savez_compressed(f"{outfilename}.npz", edges=edges)
+        
+    else:
+        raise ValueError(f"Unknown format {fmt}.")
+
+def write_packed_mask(edge_mask, outfilename, window_size, compress = True):
+    '''
+    Writes the edge mask packed into bits (8 pixels per byte) to a .npz archive.
+
+        Parameters:
+            edge_mask (array): Boolean edge mask.
+            outfilename (str): Name of the output file (without extension).
+            window_size (int or MoravecWindow): Size of the convolution window the mask was computed with.
+            compress (bool): Specifies whether to compress the archive. DEFAULT = True
+    '''
+    
+    save = np.savez_compressed if compress else np.savez
+    save(f"{outfilename}.npz", packed_mask=np.packbits(edge_mask, axis=1),
+         shape=np.array(edge_mask.shape), margin=np.array(_as_window(window_size).margin))
+
+def load_edges(filename):
+    '''
+    Loads edges written by write_edges_to_file, write_packed_mask or EdgeWriter.
+
+        Parameters:
+            filename (str): Name of the file (with extension).
+
+        Returns:
+            edges (array): Array of (row, column) pairs.
+    '''
+    
+    if filename.endswith(".csv"):
+        edges = np.loadtxt(filename, dtype=np.int32, delimiter=",", skiprows=1, ndmin=2)
+        return edges.reshape(-1, 2)
+    
+    if filename.endswith(".npy"):
+        return np.load(filename)
+    
+    if filename.endswith(".bin"):
+        return np.fromfile(filename, dtype="<i4").reshape(-1, 2)
+    
+    if filename.endswith(".npz"):
+        with np.load(filename) as archive:
+            if "edges" in archive:
+                return archive["edges"]
+            
+            # Packed masks are converted to edges shifted by the cropped margin
+            edge_mask = unpack_edge_mask(archive["packed_mask"], tuple(archive["shape"]))
+            rows, cols = np.nonzero(edge_mask)
+            return np.column_stack((rows, cols)).astype(np.int32) + np.int32(archive["margin"])
+        
+    raise ValueError(f"Unknown format of file {filename}.")
+
+class EdgeWriter:
+    '''
+    Writes edges to a file gradually while the detection is running.
+    Edges are buffered and flushed to the file whenever the buffer exceeds buffer_size edges.
+
+        Parameters:
+            outfilename (str): Name of the output file (without extension).
+            fmt (str): Format of the output file. DEFAULT = "npy" OPTIONAL = "raw"; "csv"
+            buffer_size (int): Number of edges kept in memory before flushing. DEFAULT = 1 << 20
+    '''
+    
+    # Size of the .npy header reserved at the beginning of the file (multiple of 64 bytes)
+    HEADER_SIZE = 128
+    
+    def __init__(self, outfilename, fmt = "npy", buffer_size = 1 << 20):
+        if fmt not in ("npy", "raw", "csv"):
+            raise ValueError(f"Format {fmt} cannot be written gradually.")
+        
+        self.fmt = fmt
+        self.filename = f"{outfilename}{EDGE_EXTENSIONS[fmt]}"
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.buffered = 0
+        self.count = 0
+        self.out = open(self.filename, "w" if fmt == "csv" else "wb", newline = "" if fmt == "csv" else None)
+        
+        if fmt == "csv":
+            csv.writer(self.out, delimiter = ",").writerow(["row", "column"])
+        
+        # The header of .npy file is rewritten with the final number of edges when the writer is closed
+        elif fmt == "npy":
+            self.out.write(self._npy_header(0))
+    
+    def _npy_header(self, count):
+        '''Creates .npy header of an int32 array of count edges padded to HEADER_SIZE bytes.'''
+        header = "{'descr': '<i4', 'fortran_order': False, 'shape': (%d, 2), }" % count
+        header = header.ljust(self.HEADER_SIZE - 11) + "\n"
+        return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1")
+        
+    def write(self, edges):
+        '''Adds an array of (row, column) pairs to the buffer.'''
+        edges = np.asarray(edges, dtype="<i4").reshape(-1, 2)
+        self.buffer.append(edges)
+        self.buffered += len(edges)
+        
+        if self.buffered >= self.buffer_size:
+            self.flush()
+            
+    def flush(self):
+        '''Writes the buffered edges to the file.'''
+        if self.buffer:
+            edges = np.concatenate(self.buffer)
+            
+            if self.fmt == "csv":
+                csv.writer(self.out, delimiter = ",").writerows(edges.tolist())
+            else:
+                self.out.write(edges.tobytes())
+            
+            self.count += len(edges)
+            self.buffer = []
+            self.buffered = 0
+            
+        self.out.flush()
+        
+    def close(self):
+        '''Flushes the remaining edges, completes the file and closes it.'''
+        if self.out.closed:
+            return
+        
+        self.flush()
+        
+        if self.fmt == "npy":
+            self.out.seek(0)
+            self.out.write(self._npy_header(self.count))
+            
+        self.out.close()
+        
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
         
 def save_edge_map(image_matrix, window_size, outimgname):
     '''
@@ -120,23 +395,212 @@ def save_edge_map(image_matrix, window_size, outimgname):
     edge_map = Image.fromarray((image_matrix * 255).astype(np.uint8))
     edge_map.save(f"{outimgname}.tif")
 
-def moravec(image_matrix, threshold, window_size):
+def save_edge_mask(edge_mask, outimgname):
     '''
-    An edge detection algorithm.
-    The algorithm moves the convolution window around one pixel in all directions
-    and assigns new value to this pixel based on finding whether it is an edge point or not.
-    This implementation therefore modifies the original image matrix.
+    Saves the edge mask to a tif image (255 = edge point, 0 = other pixels).
+
+        Parameters:
+            edge_mask (array): Boolean edge mask (see threshold_response).
+            outimgname (str): Name of the output image.
+    '''
+    
+    # Reinterpret the booleans as bytes instead of multiplying a full-size matrix
+    edge_map = Image.fromarray(edge_mask.view(np.uint8) * np.uint8(255))
+    edge_map.save(f"{outimgname}.tif")
+
+def _response_dtype(dtype):
+    '''
+    Selects the data types used for computing the minimum intensity values of an image.
+
+        Parameters:
+            dtype (dtype): Data type of the image matrix.
+
+        Returns:
+            difference_dtype, response_dtype (tuple): Data types of the differences and of the sums.
+    '''
+    
+    # Squared differences of 8-bit pixels fit into 32-bit integers
+    if np.dtype(dtype).itemsize == 1:
+        return np.dtype("int32"), np.dtype("uint32")
+    
+    return np.dtype("float64"), np.dtype("float64")
+
+def _squared_difference_sum(image_matrix, vector_list, radius, sums = None):
+    '''
+    Sums squared differences between every pixel and its shifted counterparts in one pass.
+
+        Parameters:
+            image_matrix (array): Image matrix.
+            vector_list (list): List of vectors to be used in edge calculation.
+            radius (int): Largest vector component (number of pixels the image is cropped by on each side).
+            sums (array): Previously computed sums cropped by radius the new differences are added to. DEFAULT = None
+
+        Returns:
+            sums (array): Sum of squared differences in all directions, cropped by radius.
+    '''
+    
+    rows, cols = image_matrix.shape
+    
+    # Central pixels are the pixels from which every vector stays inside the image
+    center = image_matrix[radius:rows - radius, radius:cols - radius]
+    difference_dtype, response_dtype = _response_dtype(image_matrix.dtype)
+    if sums is None:
+        sums = np.zeros(center.shape, dtype=response_dtype)
+        
+    diff = np.empty(center.shape, dtype=difference_dtype)
+    
+    # Shift the whole image by each vector at once using array slicing
+    # The source is never promoted, only the difference buffer is reused for all vectors
+    for vector in vector_list:
+        shifted = image_matrix[radius + vector[1]:rows - radius + vector[1], radius + vector[0]:cols - radius + vector[0]]
+        np.subtract(shifted, center, out=diff, dtype=difference_dtype)
+        np.multiply(diff, diff, out=diff)
+        np.add(sums, diff, out=sums, casting="unsafe")
+        
+    return sums
+
+def _window_minimum(sums, window, radius):
+    '''
+    Selects the lowest sum of squared differences inside the convolution window for every pixel.
+
+        Parameters:
+            sums (array): Sum of squared differences in all directions.
+            window (list): List of vectors making up the window with added origin.
+            radius (int): Largest vector component (number of pixels the sums are cropped by on each side).
+
+        Returns:
+            minimum (array): Minimum intensity values, cropped by radius.
+    '''
+    
+    rows, cols = sums.shape
+    minimum = None
+    
+    # Compare the sums of all pixels in the window at once using array slicing
+    for pixel in window:
+        shifted = sums[radius + pixel[1]:rows - radius + pixel[1], radius + pixel[0]:cols - radius + pixel[0]]
+        
+        if minimum is None:
+            minimum = shifted.copy()
+        else:
+            np.minimum(minimum, shifted, out = minimum)
+            
+    return minimum
+
+def _sum_dtype(dtype):
+    '''Selects the data type of prefix sums: integers are summed exactly in int64, other values in float64.'''
+    return np.dtype("int64") if np.dtype(dtype).kind in "iub" else np.dtype("float64")
+
+def _box_sum(values, radius):
+    '''
+    Sums values in a square of (2 * radius + 1) x (2 * radius + 1) pixels around every pixel using summed-area table.
+
+        Parameters:
+            values (array): Values to be summed.
+            radius (int): Radius of the square.
+
+        Returns:
+            sums (array): Sums of the squares (int64, float64 for float values), cropped by radius.
+    '''
+    
+    rows, cols = values.shape
+    size = 2 * radius + 1
+    sum_dtype = _sum_dtype(values.dtype)
+    
+    # The table has an extra row and column of zeros, so every square is given by four of its values
+    table = np.zeros((rows + 1, cols + 1), dtype=sum_dtype)
+    np.cumsum(values, axis=0, dtype=sum_dtype, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+    
+    return table[size:, size:] - table[:-size, size:] - table[size:, :-size] + table[:-size, :-size]
+
+def _disk_sum(values, radius):
+    '''
+    Sums values in a circle of given radius around every pixel using prefix sums of rows.
+
+        Parameters:
+            values (array): Values to be summed.
+            radius (int): Radius of the circle.
+
+        Returns:
+            sums (array): Sums of the circles (int64, float64 for float values), cropped by radius.
+    '''
+    
+    rows, cols = values.shape
+    sum_dtype = _sum_dtype(values.dtype)
+    
+    # The table has an extra column of zeros, so every part of a row is given by two of its values
+    table = np.zeros((rows, cols + 1), dtype=sum_dtype)
+    np.cumsum(values, axis=1, dtype=sum_dtype, out=table[:, 1:])
+    sums = np.zeros((rows - 2 * radius, cols - 2 * radius), dtype=sum_dtype)
+    
+    # Add the part of every row of the circle
+    for dy in range(-radius, radius + 1):
+        half = isqrt(radius**2 - dy**2)
+        band = table[radius + dy:rows - radius + dy]
+        sums += band[:, radius + half + 1:cols - radius + half + 1]
+        sums -= band[:, radius - half:cols - radius - half]
+        
+    return sums
+
+def _window_response(image_matrix, window):
+    '''
+    Computes minimum intensity values of an image large enough for the window.
+
+        Parameters:
+            image_matrix (array): Image matrix.
+            window (MoravecWindow): Window specification.
+
+        Returns:
+            response (array): Minimum intensity values, cropped by window.margin.
+    '''
+    
+    if window.shape == "star":
+        sums = _squared_difference_sum(image_matrix, window.shifts, window.shift_radius)
+        return _window_minimum(sums, window.offsets, window.radius)
+    
+    window_sum = _box_sum if window.shape == "square" else _disk_sum
+    response = None
+    
+    # Sum the squared differences of every shift over the window and keep the minimum
+    for shift in window.shifts:
+        differences = _squared_difference_sum(image_matrix, [shift], window.shift_radius)
+        energy = window_sum(differences, window.radius)
+        
+        if response is None:
+            response = energy
+        else:
+            np.minimum(response, energy, out=response)
+    
+    # Use the compact data type whenever the largest possible sum fits into it
+    response_dtype = _response_dtype(image_matrix.dtype)[1]
+    
+    if response_dtype == np.uint32 and 65025 * len(window.offsets) > np.iinfo(np.uint32).max:
+        response_dtype = np.dtype("uint64")
+    
+    return response.astype(response_dtype, copy=False)
+
+def _moravec_loop(image_matrix, threshold, window_size, in_place = False):
+    '''
+    Reference implementation of the edge detection algorithm visiting every pixel separately.
+    The sums are computed from an unmodified copy of the image matrix,
+    so the pixels already marked as edge points do not affect their neighbours.
 
         Parameters:
             image_matrix (array): Image matrix.
             threshold (int): Threshold value from which the pixel is considered an edge point.
             window_size (int): Size of the convolution window (size x size).
+            in_place (bool): Specifies whether to compute the sums from the modified image matrix like releases
+                             before the vectorized engines did (pixels already set to 4000 or 0 affect
+                             the following pixels, so many false edges are detected). DEFAULT = False
 
         Returns:
             edges_list (list): List of detected edges.
     '''
     
     edges_list = []
+    source_matrix = image_matrix if in_place else image_matrix.astype("int64")
+    vector_list = generate_vectors(window_size)
+    window = create_convolution_window(vector_list)
     
     # Iterate over each pixel in the array except those not accessible with convolution window
     for col in range(window_size - 1, image_matrix.shape[1] - window_size + 1):
@@ -155,7 +619,7 @@ def moravec(image_matrix, threshold, window_size):
                     offset_y = col + pixel[0] + vector[0]
                     offset_x = row + pixel[1] + vector[1]
     
-                    squared_diff = (image_matrix[offset_x, offset_y] - image_matrix[row + pixel[1], col + pixel[0]])**2
+                    squared_diff = (source_matrix[offset_x, offset_y] - source_matrix[row + pixel[1], col + pixel[0]])**2
                     
                     # Append the squared difference to a list
                     diff_list.append(squared_diff)
@@ -179,12 +643,577 @@ def moravec(image_matrix, threshold, window_size):
                 image_matrix[row, col] = 0
         
     return edges_list
+
+def _moravec_numpy(image_matrix, threshold, window_size):
+    '''
+    Vectorized implementation of the edge detection algorithm processing the whole image at once.
+
+        Parameters:
+            image_matrix (array): Image matrix.
+            threshold (int): Threshold value from which the pixel is considered an edge point.
+            window_size (int): Size of the convolution window (size x size).
+
+        Returns:
+            edges_list (list): List of detected edges.
+    '''
+    
+    margin = window_size - 1
+    edge_mask = threshold_response(moravec_response(image_matrix, window_size), threshold)
+    
+    # Collect the edge points column by column to keep the order of the reference implementation
+    cols, rows = np.nonzero(edge_mask.T)
+    edges_list = np.column_stack((rows + margin, cols + margin)).tolist()
+    
+    # The matrix is modified in order to visualize the edge map
+    if edge_mask.size:
+        image_matrix[margin:image_matrix.shape[0] - margin, margin:image_matrix.shape[1] - margin] = np.where(edge_mask, 4000, 0)
+    
+    return edges_list
+
+def moravec_response(image_matrix, window_size):
+    '''
+    Computes minimum intensity values of all pixels accessible with convolution window.
+    Unlike moravec, the image matrix is not modified, so the response can be thresholded repeatedly.
+
+        Parameters:
+            image_matrix (array): Image matrix, preferably with one byte per pixel (uint8).
+            window_size (int or MoravecWindow): Size of the convolution window (size x size)
+                                                or window specification (see moravec_window).
+
+        Returns:
+            response (array): Minimum intensity values (uint32 for 8-bit images, float64 otherwise),
+                              cropped by window_size - 1 pixels (window.margin) on each side like the edge map.
+    '''
+    
+    window = _as_window(window_size)
+    margin = window.margin
+    rows, cols = image_matrix.shape
+    
+    # Return an empty response if no pixel is accessible with convolution window
+    if rows <= 2 * margin or cols <= 2 * margin:
+        return np.zeros((max(rows - 2 * margin, 0), max(cols - 2 * margin, 0)), dtype=_response_dtype(image_matrix.dtype)[1])
+    
+    return _window_response(image_matrix, window)
+
+def moravec_sweep(image_matrix, thresholds, window_sizes, packed = False):
+    '''
+    Computes edge masks for all combinations of thresholds and window sizes at once.
+    Vectors of a larger window extend the vectors of a smaller one, so the sums of squared differences
+    are accumulated from the smallest window to the largest and every shifted difference is computed only once.
+    Each window size is then thresholded by all thresholds without recomputing its response.
+
+        Parameters:
+            image_matrix (array): Image matrix, preferably with one byte per pixel (uint8).
+            thresholds (list): Threshold values from which the pixel is considered an edge point.
+            window_sizes (list): Sizes of the convolution window (size x size).
+            packed (bool): Specifies whether to pack the masks into bits (8 pixels per byte). DEFAULT = False
+
+        Returns:
+            results (dict): Edge masks keyed by (window_size, threshold) tuples (see threshold_response).
+    '''
+    
+    results = {}
+    rows, cols = image_matrix.shape
+    
+    # Validate all window sizes before starting the computation
+    for window_size in window_sizes:
+        generate_vectors(window_size)
+        
+    max_radius = max(window_sizes) // 2
+    base_vector_list = generate_vectors(3)
+    sums = None
+    
+    for radius in range(1, max_radius + 1):
+        
+        # Stop when no pixel is accessible with the larger windows
+        if rows <= 4 * radius or cols <= 4 * radius:
+            break
+        
+        # Crop the sums of the smaller window and add differences of vectors multiplied by the current radius
+        if sums is not None:
+            sums = sums[1:-1, 1:-1]
+            
+        ring_vector_list = [[value * radius for value in vector] for vector in base_vector_list]
+        sums = _squared_difference_sum(image_matrix, ring_vector_list, radius, sums)
+        
+        window_size = 2 * radius + 1
+        
+        if window_size in window_sizes:
+            window = create_convolution_window(generate_vectors(window_size))
+            response = _window_minimum(sums, window, radius)
+            
+            for threshold in thresholds:
+                results[(window_size, threshold)] = threshold_response(response, threshold, packed)
+    
+    # Add empty masks for windows larger than the image
+    for window_size in window_sizes:
+        for threshold in thresholds:
+            if (window_size, threshold) not in results:
+                results[(window_size, threshold)] = threshold_response(moravec_response(image_matrix, window_size), threshold, packed)
+                
+    return results
+
+def threshold_response(response, threshold, packed = False):
+    '''
+    Creates edge mask from minimum intensity values.
+
+        Parameters:
+            response (array): Minimum intensity values (see moravec_response).
+            threshold (int): Threshold value from which the pixel is considered an edge point.
+            packed (bool): Specifies whether to pack the mask into bits (8 pixels per byte). DEFAULT = False
+
+        Returns:
+            edge_mask (array): Boolean edge mask or bit-packed edge mask (see unpack_edge_mask).
+    '''
+    
+    edge_mask = response >= threshold
+    
+    if packed:
+        return np.packbits(edge_mask, axis=1)
+    
+    return edge_mask
+
+def unpack_edge_mask(packed_mask, shape):
+    '''
+    Restores boolean edge mask from bit-packed edge mask.
+
+        Parameters:
+            packed_mask (array): Bit-packed edge mask.
+            shape (tuple): Shape of the original edge mask (equal to the shape of the response).
+
+        Returns:
+            edge_mask (array): Boolean edge mask.
+    '''
+    
+    return np.unpackbits(packed_mask, axis=1, count=shape[1]).astype(bool)
+
+def edges_from_mask(edge_mask, window_size):
+    '''
+    Converts edge mask to coordinates of edge points in the source image.
+
+        Parameters:
+            edge_mask (array): Boolean edge mask.
+            window_size (int or MoravecWindow): Size of the convolution window the mask was computed with.
+
+        Returns:
+            edges (array): Array of (row, column) pairs sorted by row and column.
+    '''
+    
+    rows, cols = np.nonzero(edge_mask)
+    return np.column_stack((rows, cols)).astype(np.int32) + np.int32(_as_window(window_size).margin)
+
+def _moravec_strip(image_name, mask_name, shape, dtype, top, bottom, threshold, window_size):
+    '''
+    Detects edges in one strip of rows of an image stored in shared memory.
+    The strip is read together with window_size - 1 rows above and below it.
+
+        Parameters:
+            image_name (str): Name of the shared memory block with the image matrix.
+            mask_name (str): Name of the shared memory block with the edge mask.
+            shape (tuple): Shape of the image matrix.
+            dtype (str): Data type of the image matrix.
+            top (int): First row of the strip.
+            bottom (int): Row following the last row of the strip.
+            threshold (int): Threshold value from which the pixel is considered an edge point.
+            window_size (int): Size of the convolution window (size x size).
+
+        Returns:
+            rows, cols (tuple): Arrays of rows and columns of detected edges sorted by row and column.
+    '''
+    
+    radius = window_size // 2
+    margin = window_size - 1
+    vector_list = generate_vectors(window_size)
+    window = create_convolution_window(vector_list)
+    
+    # Attach to the shared memory blocks without copying them
+    image_memory = shared_memory.SharedMemory(name = image_name)
+    mask_memory = shared_memory.SharedMemory(name = mask_name)
+    
+    try:
+        image_matrix = np.ndarray(shape, dtype = dtype, buffer = image_memory.buf)
+        mask = np.ndarray((shape[0] - 2 * margin, shape[1] - 2 * margin), dtype = bool, buffer = mask_memory.buf)
+        
+        sums = _squared_difference_sum(image_matrix[top - margin:bottom + margin], vector_list, radius)
+        edge_mask = _window_minimum(sums, window, radius) >= threshold
+        mask[top - margin:bottom - margin] = edge_mask
+        
+        rows, cols = np.nonzero(edge_mask)
+        
+        # Drop the views before the shared memory is closed
+        del image_matrix, mask
+        return rows + top, cols + margin
+    
+    finally:
+        image_memory.close()
+        mask_memory.close()
+
+def _moravec_parallel(image_matrix, threshold, window_size, workers = None):
+    '''
+    Parallel implementation of the edge detection algorithm.
+    The image is split into strips of rows which are processed by a pool of processes
+    sharing the image matrix and the edge mask through shared memory.
+
+        Parameters:
+            image_matrix (array): Image matrix.
+            threshold (int): Threshold value from which the pixel is considered an edge point.
+            window_size (int): Size of the convolution window (size x size).
+            workers (int): Number of processes. DEFAULT = None (number of processors)
+
+        Returns:
+            edges_list (list): List of detected edges sorted by row and column.
+    '''
+    
+    margin = window_size - 1
+    rows, cols = image_matrix.shape
+    
+    # Return early if no pixel is accessible with convolution window
+    if rows <= 2 * margin or cols <= 2 * margin:
+        return []
+    
+    workers = workers or os.cpu_count() or 1
+    
+    # Split the rows into a few strips per process to balance the load
+    strip_height = max(-(-(rows - 2 * margin) // (workers * 4)), 1)
+    strips = [(top, min(top + strip_height, rows - margin)) for top in range(margin, rows - margin, strip_height)]
+    
+    image_memory = shared_memory.SharedMemory(create = True, size = image_matrix.nbytes)
+    mask_memory = shared_memory.SharedMemory(create = True, size = (rows - 2 * margin) * (cols - 2 * margin))
+    
+    try:
+        # Copy the image into shared memory once, the processes only read from it
+        shared_image = np.ndarray(image_matrix.shape, dtype = image_matrix.dtype, buffer = image_memory.buf)
+        shared_image[:] = image_matrix
+        mask = np.ndarray((rows - 2 * margin, cols - 2 * margin), dtype = bool, buffer = mask_memory.buf)
+        
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            futures = [executor.submit(_moravec_strip, image_memory.name, mask_memory.name, image_matrix.shape,
+                                       image_matrix.dtype.str, top, bottom, threshold, window_size)
+                       for top, bottom in strips]
+            
+            # Strips are merged in their order, so the edges stay sorted by row and column
+            results = [future.result() for future in futures]
+        
+        edge_rows = np.concatenate([result[0] for result in results])
+        edge_cols = np.concatenate([result[1] for result in results])
+        edges_list = np.column_stack((edge_rows, edge_cols)).tolist()
+        
+        # The matrix is modified in order to visualize the edge map
+        image_matrix[margin:rows - margin, margin:cols - margin] = np.where(mask, 4000, 0)
+        
+        del shared_image, mask
+        return edges_list
+    
+    finally:
+        image_memory.close()
+        image_memory.unlink()
+        mask_memory.close()
+        mask_memory.unlink()
+
+def moravec(image_matrix, threshold, window_size, engine = "numpy", workers = None):
+    '''
+    An edge detection algorithm.
+    The algorithm moves the convolution window around one pixel in all directions
+    and assigns new value to this pixel based on finding whether it is an edge point or not.
+    This implementation therefore modifies the original image matrix.
+
+        Parameters:
+            image_matrix (array): Image matrix.
+            threshold (int): Threshold value from which the pixel is considered an edge point.
+            window_size (int): Size of the convolution window (size x size).
+            engine (str): Specifies how the image is processed.
+                          DEFAULT = "numpy" (whole image at once) OPTIONAL = "loop" (pixel by pixel);
+                          "parallel" (strips of rows processed by multiple processes, edges are sorted);
+                          "legacy" (pixel by pixel reading the already modified pixels, reproduces
+                          the results of releases before the vectorized engines)
+            workers (int): Number of processes used by the parallel engine. DEFAULT = None (number of processors)
+
+        Returns:
+            edges_list (list): List of detected edges.
+    '''
+    
+    if engine == "numpy":
+        return _moravec_numpy(image_matrix, threshold, window_size)
+    
+    elif engine == "loop":
+        return _moravec_loop(image_matrix, threshold, window_size)
+    
+    elif engine == "legacy":
+        return _moravec_loop(image_matrix, threshold, window_size, in_place=True)
+    
+    elif engine == "parallel":
+        return _moravec_parallel(image_matrix, threshold, window_size, workers)
+    
+    else:
+        raise ValueError(f"Unknown engine {engine}.")
+        
+def moravec_streaming(image_matrix, threshold, window_size, outfilename, outimgname, tile_size = TILE_SIZE, fmt = "npy"):
+    '''
+    Edge detection algorithm processing the image tile by tile.
+    Every tile is read together with a halo of window_size - 1 pixels (window.margin),
+    so the result is the same as if the whole image was processed at once.
+    Edge points are written to a file (see EdgeWriter) and the edge map to a .npy file after each row of tiles,
+    therefore the memory usage depends only on the tile size and the image width.
+
+        Parameters:
+            image_matrix (array): Image matrix, preferably memory-mapped (see load_image_memmap).
+            threshold (int): Threshold value from which the pixel is considered an edge point.
+            window_size (int or MoravecWindow): Size of the convolution window (size x size)
+                                                or window specification (see moravec_window).
+            outfilename (str): Name of the output file with edge points.
+            outimgname (str): Name of the output edge map (255 = edge point, 0 = other pixels).
+            tile_size (int): Number of rows and columns of the computed part of each tile. DEFAULT = TILE_SIZE
+            fmt (str): Format of the output file with edge points. DEFAULT = "npy" OPTIONAL = "raw"; "csv"
+
+        Returns:
+            edges_count (int): Number of detected edges.
+    '''
+    
+    window = _as_window(window_size)
+    margin = window.margin
+    rows, cols = image_matrix.shape
+    edges_count = 0
+    
+    # The edge map is cropped the same way as in save_edge_map
+    edge_map = np.lib.format.open_memmap(f"{outimgname}.npy", mode = "w+", dtype = np.uint8,
+                                         shape = (max(rows - 2 * margin, 0), max(cols - 2 * margin, 0)))
+    
+    with EdgeWriter(outfilename, fmt) as writer:
+        
+        # Iterate over rows of tiles (there are none if no column is accessible with convolution window)
+        for top in (range(margin, rows - margin, tile_size) if cols > 2 * margin else ()):
+            bottom = min(top + tile_size, rows - margin)
+            band_rows = []
+            band_cols = []
+            
+            # Iterate over tiles in the current row
+            for left in range(margin, cols - margin, tile_size):
+                right = min(left + tile_size, cols - margin)
+                
+                # Read the tile with the halo needed by the convolution window
+                tile = np.asarray(image_matrix[top - margin:bottom + margin, left - margin:right + margin])
+                edge_mask = _window_response(tile, window) >= threshold
+                
+                edge_map[top - margin:bottom - margin, left - margin:right - margin] = edge_mask * np.uint8(255)
+                tile_rows, tile_cols = np.nonzero(edge_mask)
+                band_rows.append(tile_rows + top)
+                band_cols.append(tile_cols + left)
+            
+            # Sort the edge points of the whole row of tiles by row and column and write them
+            band_rows = np.concatenate(band_rows)
+            band_cols = np.concatenate(band_cols)
+            order = np.lexsort((band_cols, band_rows))
+            writer.write(np.column_stack((band_rows[order], band_cols[order])))
+            edges_count += len(order)
+            
+        edge_map.flush()
+        
+    return edges_count
+
+def expand_inputs(inputs):
+    '''
+    Expands files, directories and glob patterns to a list of images.
+
+        Parameters:
+            inputs (list): Paths to images, directories containing images or glob patterns.
+
+        Returns:
+            images (list): Sorted list of unique image paths.
+    '''
+    
+    images = set()
+    
+    for item in inputs:
+        
+        # Directories are searched for files with known image extensions
+        if os.path.isdir(item):
+            images.update(os.path.join(item, name) for name in os.listdir(item) if name.lower().endswith(IMAGE_EXTENSIONS))
+        
+        # Existing files are used as they are, anything else is treated as a glob pattern
+        elif os.path.isfile(item):
+            images.add(item)
+        
+        else:
+            images.update(path for path in glob.glob(item) if os.path.isfile(path))
+            
+    return sorted(images)
+
+def output_name(img, outdir):
+    '''
+    Creates the name of the output files (without extension) of an image.
+
+        Parameters:
+            img (str): Path to the source image.
+            outdir (str): Output directory.
+
+        Returns:
+            outname (str): Path to the output files without extension.
+    '''
+    
+    return os.path.join(outdir, f"{os.path.splitext(os.path.basename(img))[0]}_edges")
+
+def is_processed(img, outname, fmt = "npy"):
+    '''
+    Checks whether the outputs of an image exist and are newer than the image.
+
+        Parameters:
+            img (str): Path to the source image.
+            outname (str): Path to the output files without extension.
+            fmt (str): Format of the output file with edge points. DEFAULT = "npy"
+
+        Returns:
+            processed (bool): True if the image does not have to be processed again.
+    '''
+    
+    outputs = [f"{outname}{EDGE_EXTENSIONS[fmt]}", f"{outname}.tif"]
+    
+    if not all(os.path.exists(output) for output in outputs):
+        return False
+    
+    return min(os.path.getmtime(output) for output in outputs) >= os.path.getmtime(img)
+
+def detect_edges(image_matrix, threshold, window_size, outname, fmt = "npy"):
+    '''
+    Detects edges in an image matrix and saves the edge points and the edge map.
+
+        Parameters:
+            image_matrix (array): Image matrix.
+            threshold (int): Threshold value from which the pixel is considered an edge point.
+            window_size (int): Size of the convolution window (size x size).
+            outname (str): Path to the output files without extension.
+            fmt (str): Format of the output file with edge points (see write_edges_to_file),
+                       "packed" writes the bit-packed edge mask instead. DEFAULT = "npy"
+
+        Returns:
+            edges_count (int): Number of detected edges.
+    '''
+    
+    mask = threshold_response(moravec_response(image_matrix, window_size), threshold)
+    save_edge_mask(mask, outname)
+    
+    if fmt == "packed":
+        write_packed_mask(mask, outname, window_size)
+        return int(np.count_nonzero(mask))
+    
+    edges = edges_from_mask(mask, window_size)
+    write_edges_to_file(edges, outname, fmt)
+    return len(edges)
+
+def process_images(images, threshold = THRESHOLD, window_size = WINDOW_SIZE, outdir = ".", workers = None, force = False, fmt = "npy"):
+    '''
+    Detects edges in multiple images concurrently.
+    Images are decoded by a pool of threads while the already decoded images are processed
+    by a pool of processes, so reading the files overlaps with the computation.
+
+        Parameters:
+            images (list): Paths to source images.
+            threshold (int): Threshold value from which the pixel is considered an edge point. DEFAULT = THRESHOLD
+            window_size (int): Size of the convolution window (size x size). DEFAULT = WINDOW_SIZE
+            outdir (str): Output directory. DEFAULT = "." (current directory)
+            workers (int): Number of processes. DEFAULT = None (number of processors)
+            force (bool): Specifies whether to process images whose outputs already exist. DEFAULT = False
+            fmt (str): Format of the output file with edge points (see detect_edges). DEFAULT = "npy"
+
+        Returns:
+            results (dict): Number of detected edges (or the raised exception) keyed by image path.
+                            Skipped images are not included.
+    '''
+    
+    # Fail early on invalid settings instead of in every process
+    generate_vectors(window_size)
+    
+    if fmt not in EDGE_EXTENSIONS:
+        raise ValueError(f"Unknown format {fmt}.")
+    
+    os.makedirs(outdir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    
+    pending = [img for img in images if force or not is_processed(img, output_name(img, outdir), fmt)]
+    results = {}
+    
+    with ThreadPoolExecutor(max_workers=workers) as decoder, ProcessPoolExecutor(max_workers=workers) as executor:
+        
+        # At most two images per process are kept in memory (decoding, decoded or computing),
+        # a new image is decoded only when the computation of another one has finished
+        limit = 2 * workers
+        decoding = deque()
+        computing = {}
+        queued = 0
         
-# Execute the script with default file names
-vector_list = generate_vectors(WINDOW_SIZE)
-window = create_convolution_window(vector_list)
-IM = convert_image_to_matrix("lena.tif")
-edges = moravec(IM, THRESHOLD, WINDOW_SIZE)
-edges.sort()
-write_edges_to_file(edges, "edges")
-save_edge_map(IM, WINDOW_SIZE, "lena_edges")
\ No newline at end of file
+        while queued < len(pending) or decoding or computing:
+            while queued < len(pending) and len(decoding) + len(computing) < limit:
+                decoding.append((pending[queued], decoder.submit(convert_image_to_matrix, pending[queued], "uint8")))
+                queued += 1
+            
+            # Submit decoded images in order, waiting for the decoding only if no computation is running
+            if decoding and (decoding[0][1].done() or not computing):
+                img, future = decoding.popleft()
+                
+                try:
+                    computing[executor.submit(detect_edges, future.result(), threshold, window_size, output_name(img, outdir), fmt)] = img
+                except Exception as error:
+                    results[img] = error
+                
+                continue
+            
+            done, _ = wait(([decoding[0][1]] if decoding else []) + list(computing), return_when=FIRST_COMPLETED)
+            
+            for future in done:
+                if future in computing:
+                    img = computing.pop(future)
+                    
+                    try:
+                        results[img] = future.result()
+                    except Exception as error:
+                        results[img] = error
+                
+    return results
+
+def main(argv = None):
+    '''
+    Command line interface detecting edges in images, directories of images or glob patterns.
+
+        Parameters:
+            argv (list): Command line arguments. DEFAULT = None (sys.argv)
+
+        Returns:
+            status (int): 0 if all images were processed, 1 otherwise.
+    '''
+    
+    parser = argparse.ArgumentParser(description="Moravec edge detector.")
+    parser.add_argument("inputs", nargs="*", default=["lena.tif"], help="images, directories or glob patterns (default: lena.tif)")
+    parser.add_argument("-t", "--threshold", type=int, default=THRESHOLD, help=f"edge threshold (default: {THRESHOLD})")
+    parser.add_argument("-w", "--window-size", type=int, default=WINDOW_SIZE, help=f"odd window size (default: {WINDOW_SIZE})")
+    parser.add_argument("-o", "--outdir", default=".", help="output directory (default: current directory)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of processes (default: number of processors)")
+    parser.add_argument("--format", choices=list(EDGE_EXTENSIONS), default="npy", help="format of the edge points (default: npy)")
+    parser.add_argument("-f", "--force", action="store_true", help="process images whose outputs already exist")
+    args = parser.parse_args(argv)
+    
+    images = expand_inputs(args.inputs)
+    
+    if not images:
+        print("No images found.", file=sys.stderr)
+        return 1
+    
+    try:
+        results = process_images(images, args.threshold, args.window_size, args.outdir, args.workers, args.force, args.format)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+    
+    status = 0
+    
+    for img in images:
+        if img not in results:
+            print(f"{img}: skipped (already processed)")
+        elif isinstance(results[img], Exception):
+            print(f"{img}: {results[img]}", file=sys.stderr)
+            status = 1
+        else:
+            print(f"{img}: {results[img]} edge points")
+            
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,383 @@
+from tsp import (DENSE_LIMIT, EuclideanDistances, IncrementalTour, Tour, best_insertion, decompose, distance_provider,
+                 improve_tour, load_coordinates_array, nearest_neighbor)
+import tsp
+import numpy as np
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+# Default settings.
+# WARNING: Engines with quadratic running time are only run on instances up to their size limit (see ENGINES).
+DATASETS = ["villages_zemplin_sjtsk.json", "religious_sites_sjtsk.json"]
+SIZES = [1000, 10000, 100000, 1000000]
+DISTRIBUTIONS = ["uniform", "clustered"]
+# Side of the square of synthetic instances in metres.
+SIDE = 1e6
+
+def _nn(engine):
+    '''Returns a runner of a repetition of nearest_neighbor with given engine.'''
+    def run(coords, rng, distances, workers):
+        return nearest_neighbor(coords, 1, "unspecified", False, engine, distances, rng)[0]
+    return run
+
+def _bi(engine):
+    '''Returns a runner of a repetition of best_insertion with given engine.'''
+    def run(coords, rng, distances, workers):
+        return best_insertion(coords, 1, "unspecified", False, engine, distances, rng)[0]
+    return run
+
+def _decompose(algorithm):
+    '''Returns a runner of decompose solving clusters with given algorithm.'''
+    def run(coords, rng, distances, workers):
+        return decompose(coords, algorithm = algorithm, workers = workers, seed = rng.randrange(2**32))[0]
+    return run
+
+# Benchmarked engines: runner, largest number of nodes and distance provider ("euclidean", "dense", "cached" or None).
+# Runners take the nodes, a random number generator, a distance provider (None = default) and the number of processes.
+# Dense and cached providers are built inside the measured time, the Euclidean provider only replaces the default one
+# for counting.
+ENGINES = {
+    "NN (kdtree)": (_nn("kdtree"), 1000000, None),
+    "NN (scan)": (_nn("scan"), 5000, None),
+    "NN (dense)": (_nn("kdtree"), DENSE_LIMIT, "dense"),
+    "NN (cached)": (_nn("kdtree"), 20000, "cached"),
+    "BI (linked)": (_bi("linked"), 20000, "euclidean"),
+    "BI (cached)": (_bi("linked"), 20000, "cached"),
+    "BI (list)": (_bi("list"), 2000, None),
+    "decompose (BI)": (_decompose("BI"), 1000000, None),
+    "decompose (NN)": (_decompose("NN"), 1000000, None),
+}
+DEFAULT_ENGINES = list(ENGINES)
+
+class CountingDistances:
+    '''
+    Distance provider counting distances returned by another provider.
+
+        Parameters:
+            provider (provider): Counted distance provider (see distance_provider).
+    '''
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.symmetric = provider.symmetric
+        self.count = 0
+
+    def __len__(self):
+        return len(self.provider)
+
+    def dist(self, i, j):
+        self.count += 1
+        return self.provider.dist(i, j)
+
+    def row(self, i, idx = None):
+        row = self.provider.row(i, idx)
+        self.count += len(row)
+        return row
+
+    def column(self, j, idx = None):
+        column = self.provider.column(j, idx)
+        self.count += len(column)
+        return column
+
+class count_distances:
+    '''
+    Context manager counting calls of euclidean_dist in module tsp (k-d tree, scan and list engines).
+    Distances calculated in worker processes are not counted.
+    '''
+
+    def __enter__(self):
+        self.count = 0
+        self.original = tsp.euclidean_dist
+
+        def counted(x1, y1, x2, y2):
+            self.count += 1
+            return self.original(x1, y1, x2, y2)
+
+        tsp.euclidean_dist = counted
+        return self
+
+    def __exit__(self, *exc):
+        tsp.euclidean_dist = self.original
+
+def synthetic_instance(size, distribution = "uniform", seed = 0):
+    '''
+    Generates random nodes in a square.
+
+        Parameters:
+            size (int): Number of nodes.
+            distribution (str): DEFAULT = "uniform" OPTIONAL = "clustered" (Gaussian clusters of about 1000 nodes)
+            seed (int): Seed of the random generator. DEFAULT = 0
+
+        Returns:
+            coords_list (list): List of coordinates of nodes.
+    '''
+
+    rng = np.random.default_rng(seed)
+
+    if distribution == "uniform":
+        return (rng.random((size, 2)) * SIDE).tolist()
+
+    clusters = max(size // 1000, 5)
+    centers = rng.random((clusters, 2)) * SIDE
+    spread = SIDE / (4 * np.sqrt(clusters))
+    points = centers[rng.integers(0, clusters, size)] + rng.normal(0, spread, (size, 2))
+    return np.clip(points, 0, SIDE).tolist()
+
+def measure(function, *args, **kwargs):
+    '''
+    Measures wall time and peak memory allocated by a function call.
+    Memory allocated by worker processes is not included.
+
+        Parameters:
+            function (function): Measured function.
+            args, kwargs: Arguments of the function.
+
+        Returns:
+            result, seconds, peak (tuple): Result of the call, wall time in seconds and peak memory in bytes.
+    '''
+
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    try:
+        result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return result, seconds, peak
+
+def run_engine(name, coords, seed = 0, workers = None, profile = True):
+    '''
+    Runs an engine once with timing and once with counting of distances and tracing of memory.
+    Both runs use the same seed, so they create the same circuit.
+
+        Parameters:
+            name (str): Name of the engine (see ENGINES).
+            coords (list): List of coordinates of nodes.
+            seed (int): Seed of the random number generator. DEFAULT = 0
+            workers (int): Number of processes of decompose. DEFAULT = None (number of processors)
+            profile (bool): Specifies whether to count distances and measure peak memory. DEFAULT = True
+
+        Returns:
+            entry (dict): Benchmark record without the instance description.
+    '''
+
+    runner, _, provider = ENGINES[name]
+    start = time.perf_counter()
+    distances = distance_provider(coords, provider) if provider in ("dense", "cached") else None
+    tour = runner(coords, random.Random(seed), distances, workers)
+    seconds = time.perf_counter() - start
+    entry = {"engine": name, "seconds": round(seconds, 6), "length": round(tour.length, 3),
+             "distance_evaluations": None, "peak_mb": None}
+
+    if profile:
+        providers = []
+
+        def traced():
+
+            # Dense and cached providers are built again while tracing, so they are included in the peak memory
+            if provider is not None:
+                providers.append(CountingDistances(distance_provider(coords, provider) if provider != "euclidean"
+                                                   else EuclideanDistances(coords)))
+
+            return runner(coords, random.Random(seed), providers[0] if providers else None, workers)
+
+        with count_distances() as counter:
+            _, _, peak = measure(traced)
+
+        if not name.startswith("decompose"):
+            entry["distance_evaluations"] = counter.count + sum(counting.count for counting in providers)
+
+        entry["peak_mb"] = round(peak / 2**20, 2)
+
+    return entry
+
+def record(results, instance, nodes, entry):
+    '''Appends a benchmark record to results and prints it.'''
+
+    entry = {"instance": instance, "nodes": nodes, **entry}
+    results.append(entry)
+    evaluations = entry["distance_evaluations"]
+    print(f"{entry['engine']:<16} {instance:<30} {nodes:>8} {entry['seconds']:>10.4f} s "
+          f"{entry['length'] / 1000:>14.2f} km {evaluations if evaluations is not None else '-':>14} "
+          f"{entry['peak_mb'] if entry['peak_mb'] is not None else '-':>10} MB")
+
+def instances(datasets = DATASETS, sizes = SIZES, distributions = DISTRIBUTIONS, seed = 0):
+    '''
+    Yields benchmark instances, bundled datasets first.
+
+        Parameters:
+            datasets (list): GeoJSON files with Point geometries. DEFAULT = DATASETS
+            sizes (list): Numbers of nodes of synthetic instances. DEFAULT = SIZES
+            distributions (list): Distributions of synthetic instances. DEFAULT = DISTRIBUTIONS
+            seed (int): Seed of synthetic instances. DEFAULT = 0
+
+        Yields:
+            name, coords (tuple): Name of the instance and list of coordinates of its nodes.
+    '''
+
+    directory = os.path.dirname(os.path.abspath(__file__))
+
+    for dataset in datasets:
+        path = dataset if os.path.exists(dataset) else os.path.join(directory, dataset)
+        yield os.path.basename(dataset), load_coordinates_array(path, cache = False).tolist()
+
+    for size in sizes:
+        for distribution in distributions:
+            yield f"{distribution}_{size}", synthetic_instance(size, distribution, seed)
+
+def benchmark(datasets = DATASETS, sizes = SIZES, distributions = DISTRIBUTIONS, engines = DEFAULT_ENGINES,
+              seed = 0, workers = None, profile = True):
+    '''
+    Benchmarks TSP engines on the bundled datasets and synthetic instances.
+
+        Parameters:
+            datasets (list): GeoJSON files with Point geometries. DEFAULT = DATASETS
+            sizes (list): Numbers of nodes of synthetic instances. DEFAULT = SIZES
+            distributions (list): Distributions of synthetic instances. DEFAULT = DISTRIBUTIONS
+            engines (list): Benchmarked engines (see ENGINES). DEFAULT = DEFAULT_ENGINES
+            seed (int): Seed of instances and engines. DEFAULT = 0
+            workers (int): Number of processes of decompose. DEFAULT = None (number of processors)
+            profile (bool): Specifies whether to count distances and measure peak memory. DEFAULT = True
+
+        Returns:
+            results (list): List of benchmark records.
+    '''
+
+    results = []
+
+    for instance, coords in instances(datasets, sizes, distributions, seed):
+        for name in engines:
+
+            # Quadratic engines take hours on large instances
+            if len(coords) > ENGINES[name][1]:
+                continue
+
+            record(results, instance, len(coords), run_engine(name, coords, seed, workers, profile))
+
+    return results
+
+def valid_tour(tour, nodes, length = None):
+    '''
+    Checks that a circuit visits every node exactly once and that its length is correct.
+
+        Parameters:
+            tour (Tour): Checked circuit.
+            nodes (int): Number of nodes.
+            length (float): Reported length of the circuit. DEFAULT = None (length of the tour)
+
+        Returns:
+            valid (bool): True if the order is a permutation of the nodes and the length matches a recalculated one.
+    '''
+
+    length = tour.length if length is None else length
+    expected = Tour(tour.order, tour.points).length
+    return (len(tour.order) == nodes and np.array_equal(np.sort(tour.order), np.arange(nodes))
+            and abs(length - expected) <= 1e-6 * max(expected, 1))
+
+def check_engines(datasets = DATASETS, reps = 3, seed = 0, workers = None):
+    '''
+    Checks that the fast engines create the same circuits as the reference engines on the bundled datasets
+    and that decompose, improve_tour and IncrementalTour.update create valid circuits with correct lengths.
+
+        Parameters:
+            datasets (list): GeoJSON files with Point geometries. DEFAULT = DATASETS
+            reps (int): Number of repetitions. DEFAULT = 3
+            seed (int): Seed of the random number generators. DEFAULT = 0
+            workers (int): Number of processes of decompose. DEFAULT = None (number of processors)
+
+        Returns:
+            mismatches (list): Descriptions of engines that differ from the reference engines or create invalid circuits.
+    '''
+
+    mismatches = []
+    pairs = [("NN (kdtree)", nearest_neighbor, "kdtree", "scan"), ("BI (linked)", best_insertion, "linked", "list")]
+
+    def report(name, instance, matches):
+        print(f"{name:<24} {instance:<30}: {'OK' if matches else 'MISMATCH'}")
+
+        if not matches:
+            mismatches.append(f"{name} ({instance})")
+
+    for instance, coords in instances(datasets, [], []):
+        for name, solver, engine, reference in pairs:
+            tours = [[tour.order.tolist() for tour in solver(coords, reps, "unspecified", False, engine, rng = random.Random(seed))]
+                     for engine in (engine, reference)]
+            report(name, instance, tours[0] == tours[1])
+
+        # Small clusters, so the bundled datasets are split into many of them
+        for method in ("grid", "kmeans"):
+            for algorithm in ("NN", "BI"):
+                tour, summary = decompose(coords, max(len(coords) // 25, 2), method, algorithm, workers, seed, repair = 1.0)
+                report(f"decompose ({method}, {algorithm})", instance, valid_tour(tour, len(coords), summary["length"]))
+
+        initial = nearest_neighbor(coords, 1, "unspecified", False, rng = random.Random(seed))[0]
+        tour, summary = improve_tour(coords, initial, 1.0)
+        report("improve_tour", instance, valid_tour(tour, len(coords), summary["final"]))
+
+        # Remove and add about a tenth of the nodes twice, with and without repair
+        rng = random.Random(seed)
+        incremental = IncrementalTour(coords, best_insertion(coords, 1, "unspecified", False, rng = rng)[0])
+        valid = True
+
+        for repair in (None, 1.0):
+            current = incremental.result()[0]
+            removed = rng.sample(current, len(current) // 10)
+            added = [[coord[0] + rng.uniform(-500, 500), coord[1] + rng.uniform(-500, 500)]
+                     for coord in rng.sample(current, len(current) // 10)]
+            summary = incremental.update(added, removed, repair)
+            nodes, tour = incremental.result()
+            valid = valid and valid_tour(tour, len(nodes), summary["length"])
+
+        report("IncrementalTour", instance, valid)
+
+    return mismatches
+
+def main(argv = None):
+    '''
+    Command line interface running the correctness check and the benchmark.
+
+        Parameters:
+            argv (list): Command line arguments. DEFAULT = None (sys.argv)
+
+        Returns:
+            status (int): 0 if all engines match the reference engines, 1 otherwise.
+    '''
+
+    parser = argparse.ArgumentParser(description="Benchmark and regression check of the TSP solvers.")
+    parser.add_argument("--datasets", nargs="*", default=DATASETS, help="GeoJSON files with Point geometries")
+    parser.add_argument("--sizes", type=int, nargs="*", default=SIZES, help="numbers of nodes of synthetic instances")
+    parser.add_argument("--distributions", nargs="*", choices=DISTRIBUTIONS, default=DISTRIBUTIONS,
+                        help="distributions of synthetic instances")
+    parser.add_argument("--engines", nargs="+", choices=list(ENGINES), default=DEFAULT_ENGINES, help="benchmarked engines")
+    parser.add_argument("--seed", type=int, default=0, help="seed of instances and engines")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of processes of decompose")
+    parser.add_argument("--no-profile", action="store_true", help="only measure wall time and tour length")
+    parser.add_argument("--check-only", action="store_true", help="only check the engines, without the benchmark")
+    parser.add_argument("--json", help="file the benchmark records are written to")
+    args = parser.parse_args(argv)
+
+    mismatches = check_engines(args.datasets, seed=args.seed, workers=args.workers)
+
+    if mismatches:
+        print("Engines differing from the reference engines or creating invalid circuits: " + ", ".join(mismatches), file=sys.stderr)
+        return 1
+
+    if not args.check_only:
+        results = benchmark(args.datasets, args.sizes, args.distributions, args.engines, args.seed, args.workers,
+                            not args.no_profile)
+
+        if args.json:
+            with open(args.json, "w") as out:
+                json.dump(results, out, indent=2)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
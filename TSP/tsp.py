@@ -1,15 +1,481 @@
 import json
 from math import sqrt, inf
 from json.decoder import JSONDecodeError
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
 import matplotlib.pyplot as plt
+import numpy as np
+import heapq
+import os
 import random
+import re
 import sys
+import time
+
+# Largest number of nodes for which a dense distance matrix is built (float32 matrix of 10000 nodes takes 400 MB)
+DENSE_LIMIT = 10000
 
 def euclidean_dist(x1, y1, x2, y2):
     '''Calculates Euclidean distance using Pythagorean theorem.'''
     return sqrt((x2-x1)**2 + (y2-y1)**2)
 
-def nearest_neighbor(coords_list, reps, starting_node, separate_plots):
+class Tour:
+    '''
+    Hamiltonian circuit stored as a permutation of indices of nodes over an array of coordinates
+    shared by all circuits of the same nodes. The length of the circuit is calculated once.
+    For compatibility with [W, circuit] results, the tour can be unpacked: W, circuit = tour
+
+        Parameters:
+            order (array): Indices of nodes in order of the circuit (without returning to the first node).
+            points (array): Coordinates of all nodes, shape (n, 2).
+            length (float): Length of the circuit. DEFAULT = None (calculated when needed)
+    '''
+    
+    __slots__ = ("order", "points", "_length")
+    
+    def __init__(self, order, points, length = None):
+        self.order = np.asarray(order, dtype = np.int32)
+        self.points = points
+        self._length = length
+    
+    def __len__(self):
+        return len(self.order)
+    
+    def __iter__(self):
+        yield self.length
+        yield self.circuit()
+    
+    def __getitem__(self, item):
+        if item in (0, -2):
+            return self.length
+        
+        if item in (1, -1):
+            return self.circuit()
+        
+        raise IndexError("Tour index out of range.")
+    
+    def __repr__(self):
+        return f"Tour(nodes={len(self)}, length={self.length:.2f})"
+    
+    @property
+    def length(self):
+        '''Length of the circuit.'''
+        if self._length is None:
+            points = self.points[self.order]
+            self._length = float(np.hypot(*(np.roll(points, -1, axis = 0) - points).T).sum()) if len(points) else 0.0
+            
+        return self._length
+    
+    def coordinates(self):
+        '''Returns coordinates of the nodes in order of the circuit ending with the first node, shape (n + 1, 2).'''
+        return self.points[np.append(self.order, self.order[:1])]
+    
+    def circuit(self):
+        '''Returns the circuit as a list of coordinates ending with the first node.'''
+        return self.coordinates().tolist()
+
+def tour_points(coords_list):
+    '''
+    Converts nodes to the array of coordinates shared by tours.
+
+        Parameters:
+            coords_list (list): List of coordinations of nodes.
+
+        Returns:
+            points (array): Coordinates of nodes (float64), arrays are used without copying.
+    '''
+    
+    return np.asarray(coords_list, dtype = float)[:, :2]
+
+class KDTree:
+    '''
+    k-d tree of nodes supporting removal of nodes and nearest neighbor queries.
+    Every tree node stores the number of its nodes which were not removed yet,
+    so the subtrees without remaining nodes are skipped by the queries.
+
+        Parameters:
+            coords_list (list): List of coordinations of nodes.
+            leaf_size (int): Maximum number of nodes in a leaf. DEFAULT = 16
+    '''
+    
+    def __init__(self, coords_list, leaf_size = 16):
+        self.xs = [coord[0] for coord in coords_list]
+        self.ys = [coord[1] for coord in coords_list]
+        
+        # Tree nodes are stored in lists indexed by tree node number
+        # Leaves have no children (-1) and store indices of their nodes
+        self.lower = []
+        self.upper = []
+        self.parent = []
+        self.bbox = []
+        self.points = []
+        self.size = []
+        self.leaf_of = [0] * len(coords_list)
+        
+        stack = [(list(range(len(coords_list))), -1, False)]
+        
+        while stack:
+            indices, parent, is_upper = stack.pop()
+            node = len(self.size)
+            xs = [self.xs[idx] for idx in indices]
+            ys = [self.ys[idx] for idx in indices]
+            
+            self.lower.append(-1)
+            self.upper.append(-1)
+            self.parent.append(parent)
+            self.bbox.append((min(xs, default=0), min(ys, default=0), max(xs, default=0), max(ys, default=0)))
+            self.points.append([])
+            self.size.append(len(indices))
+            
+            if parent >= 0:
+                if is_upper:
+                    self.upper[parent] = node
+                else:
+                    self.lower[parent] = node
+            
+            # Store small sets of nodes in a leaf
+            if len(indices) <= leaf_size:
+                self.points[node] = indices
+                for idx in indices:
+                    self.leaf_of[idx] = node
+                continue
+            
+            # Split the nodes in half along the longer side of the bounding box
+            minx, miny, maxx, maxy = self.bbox[node]
+            axis = self.xs if maxx - minx >= maxy - miny else self.ys
+            indices.sort(key = axis.__getitem__)
+            half = len(indices) // 2
+            stack.append((indices[half:], node, True))
+            stack.append((indices[:half], node, False))
+        
+        self.initial_size = list(self.size)
+        self.removed = [False] * len(coords_list)
+    
+    def __len__(self):
+        return self.size[0] if self.size else 0
+    
+    def reset(self):
+        '''Restores all removed nodes.'''
+        self.size = list(self.initial_size)
+        self.removed = [False] * len(self.removed)
+    
+    def remove(self, idx):
+        '''Removes node with given index from the tree.'''
+        if self.removed[idx]:
+            return
+        
+        self.removed[idx] = True
+        node = self.leaf_of[idx]
+        
+        # Decrease the number of remaining nodes of the leaf and all its ancestors
+        while node >= 0:
+            self.size[node] -= 1
+            node = self.parent[node]
+    
+    def _box_dist(self, node, x, y):
+        '''Calculates distance from a point to the bounding box of a tree node (lower bound of distances to its nodes).'''
+        minx, miny, maxx, maxy = self.bbox[node]
+        dx = max(minx - x, 0, x - maxx)
+        dy = max(miny - y, 0, y - maxy)
+        return sqrt(dx**2 + dy**2)
+    
+    def nearest(self, x, y):
+        '''
+        Finds the nearest remaining node to a point.
+        Ties are resolved in favour of the lowest index, as in a linear scan of all nodes.
+
+            Parameters:
+                x, y (float): Coordinates of the point.
+
+            Returns:
+                min_dist, u_idx (tuple): Distance to the nearest node and its index.
+        '''
+        
+        min_dist = inf
+        u_idx = -1
+        stack = [0] if len(self) else []
+        
+        while stack:
+            node = stack.pop()
+            
+            # Skip tree nodes without remaining nodes or farther than the current minimum distance
+            if self.size[node] == 0 or self._box_dist(node, x, y) > min_dist:
+                continue
+            
+            if self.lower[node] < 0:
+                for idx in self.points[node]:
+                    if self.removed[idx]:
+                        continue
+                    
+                    dist = euclidean_dist(x, y, self.xs[idx], self.ys[idx])
+                    
+                    if dist < min_dist or (dist == min_dist and idx < u_idx):
+                        min_dist = dist
+                        u_idx = idx
+                continue
+            
+            # Visit the closer child first
+            lower, upper = self.lower[node], self.upper[node]
+            
+            if self._box_dist(lower, x, y) <= self._box_dist(upper, x, y):
+                stack.append(upper)
+                stack.append(lower)
+            else:
+                stack.append(lower)
+                stack.append(upper)
+                
+        return min_dist, u_idx
+    
+    def nearest_k(self, x, y, k):
+        '''
+        Finds k nearest remaining nodes to a point.
+
+            Parameters:
+                x, y (float): Coordinates of the point.
+                k (int): Number of nodes.
+
+            Returns:
+                neighbors (list): List of (distance, index) pairs sorted by distance.
+        '''
+        
+        # Max-heap of the k nearest nodes found so far (distances are negated)
+        heap = []
+        stack = [0] if len(self) and k > 0 else []
+        
+        while stack:
+            node = stack.pop()
+            bound = -heap[0][0] if len(heap) == k else inf
+            
+            if self.size[node] == 0 or self._box_dist(node, x, y) > bound:
+                continue
+            
+            if self.lower[node] < 0:
+                for idx in self.points[node]:
+                    if self.removed[idx]:
+                        continue
+                    
+                    dist = euclidean_dist(x, y, self.xs[idx], self.ys[idx])
+                    
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-dist, -idx))
+                    elif (-dist, -idx) > heap[0]:
+                        heapq.heapreplace(heap, (-dist, -idx))
+                continue
+            
+            lower, upper = self.lower[node], self.upper[node]
+            
+            if self._box_dist(lower, x, y) <= self._box_dist(upper, x, y):
+                stack.append(upper)
+                stack.append(lower)
+            else:
+                stack.append(lower)
+                stack.append(upper)
+                
+        return sorted((-dist, -idx) for dist, idx in heap)
+
+class EuclideanDistances:
+    '''
+    Distance provider calculating Euclidean distances between nodes on demand.
+
+        Parameters:
+            coords_list (list): List of coordinations of nodes.
+    '''
+    
+    symmetric = True
+    
+    def __init__(self, coords_list):
+        self.coords_list = coords_list
+        self.coords = np.array(coords_list, dtype = float).reshape(len(coords_list), -1)[:, :2]
+        
+    def __len__(self):
+        return len(self.coords)
+    
+    def dist(self, i, j):
+        '''Returns distance from node i to node j.'''
+        return euclidean_dist(self.coords_list[i][0], self.coords_list[i][1], self.coords_list[j][0], self.coords_list[j][1])
+    
+    def row(self, i, idx = None):
+        '''Returns distances from node i to nodes with indices idx (all nodes if not specified).'''
+        coords = self.coords if idx is None else self.coords[idx]
+        return np.sqrt((coords[:, 0] - self.coords[i, 0])**2 + (coords[:, 1] - self.coords[i, 1])**2)
+    
+    def column(self, j, idx = None):
+        '''Returns distances from nodes with indices idx (all nodes if not specified) to node j.'''
+        return self.row(j, idx)
+    
+    def block(self, start, stop):
+        '''Returns distances from nodes start, ..., stop - 1 to all nodes as a matrix.'''
+        coords = self.coords[start:stop]
+        return np.sqrt((self.coords[:, 0] - coords[:, 0, None])**2 + (self.coords[:, 1] - coords[:, 1, None])**2)
+
+class DenseDistances:
+    '''
+    Distance provider backed by a distance matrix computed once (or loaded from a file, see load_distance_matrix).
+
+        Parameters:
+            matrix (array): Square matrix of distances, matrix[i, j] is the distance from node i to node j.
+            symmetric (bool): Specifies whether the distances do not depend on the direction. DEFAULT = True
+    '''
+    
+    def __init__(self, matrix, symmetric = True):
+        if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+            sys.exit("The distance matrix has to be square.")
+            
+        self.matrix = matrix
+        self.symmetric = symmetric
+        
+    @classmethod
+    def from_coords(cls, coords_list, dtype = np.float32, block_size = 1024):
+        '''Computes the matrix of Euclidean distances between nodes in blocks of rows.'''
+        euclidean = EuclideanDistances(coords_list)
+        matrix = np.empty((len(euclidean), len(euclidean)), dtype = dtype)
+        
+        for start in range(0, len(euclidean), block_size):
+            matrix[start:start + block_size] = euclidean.block(start, start + block_size)
+            
+        return cls(matrix)
+    
+    def __len__(self):
+        return len(self.matrix)
+    
+    def dist(self, i, j):
+        '''Returns distance from node i to node j.'''
+        return float(self.matrix[i, j])
+    
+    def row(self, i, idx = None):
+        '''Returns distances from node i to nodes with indices idx (all nodes if not specified).'''
+        return self.matrix[i] if idx is None else self.matrix[i, idx]
+    
+    def column(self, j, idx = None):
+        '''Returns distances from nodes with indices idx (all nodes if not specified) to node j.'''
+        if self.symmetric:
+            return self.row(j, idx)
+        return self.matrix[:, j] if idx is None else self.matrix[idx, j]
+
+class CachedDistances:
+    '''
+    Distance provider computing rows of the distance matrix on demand
+    and keeping the recently used rows (LRU cache), so the memory usage is bounded.
+    Distances to a subset of nodes are computed only for that subset if the row is not cached.
+
+        Parameters:
+            provider (EuclideanDistances): Provider computing the rows.
+            max_bytes (int): Maximum memory used by cached rows. DEFAULT = 256 MB
+            dtype (type): Data type of cached distances. DEFAULT = np.float32
+    '''
+    
+    def __init__(self, provider, max_bytes = 256 * 2**20, dtype = np.float32):
+        self.provider = provider
+        self.symmetric = provider.symmetric
+        self.dtype = dtype
+        self.max_rows = max(1, max_bytes // (max(len(provider), 1) * np.dtype(dtype).itemsize))
+        self.rows = OrderedDict()
+        
+    def __len__(self):
+        return len(self.provider)
+    
+    def _cached(self, i):
+        '''Returns row i if it is cached, None otherwise.'''
+        row = self.rows.get(i)
+        
+        if row is not None:
+            self.rows.move_to_end(i)
+            
+        return row
+    
+    def dist(self, i, j):
+        '''Returns distance from node i to node j.'''
+        row = self._cached(i)
+        return float(row[j]) if row is not None else self.provider.dist(i, j)
+    
+    def row(self, i, idx = None):
+        '''Returns distances from node i to nodes with indices idx (all nodes if not specified).'''
+        row = self._cached(i)
+        
+        if row is not None:
+            return row if idx is None else row[idx]
+        
+        # Distances to a subset of nodes are not cached
+        if idx is not None:
+            return self.provider.row(i, idx)
+        
+        row = self.provider.row(i).astype(self.dtype)
+        self.rows[i] = row
+        
+        # Drop the least recently used row
+        if len(self.rows) > self.max_rows:
+            self.rows.popitem(last = False)
+            
+        return row
+    
+    def column(self, j, idx = None):
+        '''Returns distances from nodes with indices idx (all nodes if not specified) to node j.'''
+        if self.symmetric:
+            return self.row(j, idx)
+        return self.provider.column(j, idx)
+
+def load_distance_matrix(filename, symmetric = False):
+    '''
+    Loads precomputed distance matrix (e.g. road network distances) from a .npy file without reading it into memory.
+
+        Parameters:
+            filename (str): A .npy file containing square matrix of distances.
+            symmetric (bool): Specifies whether the distances do not depend on the direction. DEFAULT = False
+
+        Returns:
+            distances (DenseDistances): Distance provider backed by the memory-mapped matrix.
+    '''
+    
+    try:
+        return DenseDistances(np.load(filename, mmap_mode = "r"), symmetric)
+    
+    except FileNotFoundError:
+        sys.exit(f"File {filename} not found.")
+    
+    except ValueError:
+        sys.exit(f"{filename}: Invalid distance matrix file.")
+
+def distance_provider(coords_list, distances = "auto"):
+    '''
+    Creates distance provider shared by all repetitions of both algorithms.
+
+        Parameters:
+            coords_list (list): List of coordinations of nodes.
+            distances (str or provider): DEFAULT = "auto" (dense matrix for at most DENSE_LIMIT nodes, None otherwise,
+                                         so the algorithms use the k-d tree and Euclidean distances calculated on demand)
+                                         OPTIONAL = "dense"; "cached"; name of a .npy file with distance matrix;
+                                         existing provider (returned as it is)
+
+        Returns:
+            distances (provider): Distance provider or None.
+    '''
+    
+    if not isinstance(distances, str):
+        provider = distances
+        
+    elif distances == "dense" or (distances == "auto" and len(coords_list) <= DENSE_LIMIT):
+        provider = DenseDistances.from_coords(coords_list)
+    
+    # Rows of large instances are rarely used twice, computing them on demand is faster than caching
+    elif distances == "auto":
+        return None
+    
+    elif distances == "cached":
+        provider = CachedDistances(EuclideanDistances(coords_list))
+    
+    else:
+        provider = load_distance_matrix(distances)
+    
+    if len(provider) != len(coords_list):
+        sys.exit("The number of distances does not match the number of nodes.")
+        
+    return provider
+
+def nearest_neighbor(coords_list, reps, starting_node, separate_plots, engine = "kdtree", distances = None, rng = random):
     '''
     Nearest Neighbor algorithm.
 
@@ -19,13 +485,30 @@ def nearest_neighbor(coords_list, reps, starting_node, separate_plots):
                         repetitions will not yield different results.
             starting_node (int): Index of the starting node.
             separate_plots (bool): Specifies whether to draw separate plots for this algorithm.
+            engine (str): Specifies how the nearest node is found.
+                          DEFAULT = "kdtree" (k-d tree of Not Processed nodes) OPTIONAL = "scan" (all nodes are scanned)
+                          Both engines create identical circuits.
+            distances (provider): Distance provider (see distance_provider). If specified, the nearest node
+                                  is found in rows of its distance matrix instead of using the engine. DEFAULT = None
+            rng (Random): Random number generator. DEFAULT = random (global state)
 
         Returns:
-            results (list): List of Hamiltonian circuits and their lengths.
+            results (list): List of Hamiltonian circuits (see Tour).
     '''
     
-    # Prepare results list
+    # Prepare results list and coordinates shared by all circuits
     results = []
+    points = tour_points(coords_list)
+    
+    # Build the k-d tree once, processed nodes are removed from it in every repetition
+    if distances is not None:
+        engine = "distances"
+        
+    elif engine == "kdtree":
+        tree = KDTree(coords_list)
+        
+    elif engine != "scan":
+        sys.exit(f"Unknown engine {engine}.")
         
     # Repeat the algorithm number of reps times
     for rep in range(reps):
@@ -38,7 +521,7 @@ def nearest_neighbor(coords_list, reps, starting_node, separate_plots):
         # Choose random index from the input list of points
         # Then initialize coordinates of starting point using this index
         if starting_node == "unspecified":
-            ui_idx = random.randrange(len(coords_list))
+            ui_idx = rng.randrange(len(coords_list))
             ui = coords_list[ui_idx]
         
         # If starting node was specified, initialize its coordinates
@@ -48,14 +531,44 @@ def nearest_neighbor(coords_list, reps, starting_node, separate_plots):
             
         # Set status of the starting point to "P" (Processed)
         status[ui_idx] = "P"
+        start_idx = ui_idx
         
-        # Prepare list for visualization of Hamiltonian circuit
+        # Prepare list of indices of nodes of Hamiltonian circuit
         # Append the starting point to this list
-        circuit = []
-        circuit.append(ui)
+        order = []
+        order.append(ui_idx)
+        
+        # Find the nearest Not Processed nodes in rows of the distance matrix
+        if engine == "distances":
+            processed = np.zeros(len(coords_list), dtype = bool)
+            processed[ui_idx] = True
+            
+            for _ in range(len(coords_list) - 1):
+                row = np.where(processed, inf, distances.row(ui_idx))
+                u_idx = int(np.argmin(row))
+                W += float(row[u_idx])
+                order.append(u_idx)
+                processed[u_idx] = True
+                ui_idx = u_idx
+            
+            ui = coords_list[ui_idx]
+        
+        # Find the nearest Not Processed nodes using the k-d tree
+        # Processed nodes are removed from the tree, so its size is the number of Not Processed nodes
+        if engine == "kdtree":
+            tree.reset()
+            tree.remove(ui_idx)
+            
+            while len(tree):
+                min_dist, u_idx = tree.nearest(ui[0], ui[1])
+                u = coords_list[u_idx]
+                W += min_dist
+                order.append(u_idx)
+                ui = u
+                tree.remove(u_idx)
         
         # While any Not Processed nodes exist
-        while "N" in status:
+        while engine == "scan" and "N" in status:
             
             # Initialize minimum distance to infinity
             min_dist = inf
@@ -76,7 +589,7 @@ def nearest_neighbor(coords_list, reps, starting_node, separate_plots):
             # Add minimum distance to the current length of Hamiltonian circuit
             # Append endpoint to the Hamiltonian circle
             W += min_dist
-            circuit.append(u)
+            order.append(u_idx)
             
             # Set starting point to current endpoint
             ui = u
@@ -84,24 +597,112 @@ def nearest_neighbor(coords_list, reps, starting_node, separate_plots):
             # Change the status of current endpoint to Processed
             status[u_idx] = "P"
         
-        # Add first point to the end of the Hamiltonian circuit list to form a circle
-        # Calculate the remaining distance between two last points
-        W += euclidean_dist(ui[0], ui[1], circuit[0][0], circuit[0][1])
-        circuit.append(circuit[0])
+        # Calculate the remaining distance between two last points to form a circle
+        if engine == "distances":
+            W += distances.dist(ui_idx, start_idx)
+        else:
+            W += euclidean_dist(ui[0], ui[1], coords_list[start_idx][0], coords_list[start_idx][1])
         
-        # Append length W and Hamiltonian circuit
-        results.append([W, circuit])
+        # Append Hamiltonian circuit with its length W
+        results.append(Tour(order, points, W))
         
         if separate_plots:
-            plt.plot([coord[0] for coord in circuit], [coord[1] for coord in circuit], c="black", linewidth=1)
-            plt.scatter([coord[0] for coord in coords_list], [coord[1] for coord in coords_list], s=20, c = "white", edgecolors = "black")
-            plt.scatter(circuit[0][0], circuit[0][1], s=40, c = "red", edgecolors = "red")
-            plt.title("Nearest Neighbor method, W = {} km".format(round(W/1000, 2)))
+            _draw_tour(plt.gca(), results[-1], "Nearest Neighbor method", coords_list)
             plt.show()
     
     return results
 
-def best_insertion(coords_list, reps, starting_node, separate_plots):
+def _insert_linked(coords_list, distances, random_indices, status, rng = random):
+    '''
+    Inserts all Not Processed nodes into the initial circle of the Best Insertion algorithm.
+    The circuit is stored as an array-backed linked list of positions with cached lengths of its edges,
+    so the length increments of all edges are evaluated at once and every insertion takes constant time.
+
+        Parameters:
+            coords_list (list): List of coordinations of nodes.
+            distances (provider): Distance provider (see distance_provider).
+            random_indices (list): Indices of nodes of the initial circle (the first index is repeated at the end).
+            status (list): Status of all nodes ("N" = Not Processed, "P" = Processed).
+            rng (Random): Random number generator. DEFAULT = random (global state)
+
+        Returns:
+            W, order (tuple): Length of the Hamiltonian circuit and indices of its nodes.
+    '''
+    
+    # Positions of the circuit are numbered in order of insertion
+    # Position 0 is the starting node, the edge leading back to it is never used for insertion
+    capacity = len(coords_list) + len(random_indices)
+    node = np.zeros(capacity, dtype = np.intp)
+    next_pos = np.zeros(capacity, dtype = np.intp)
+    edge_length = np.zeros(capacity)
+    
+    count = len(random_indices) - 1
+    last = count - 1
+    W = 0
+    
+    # Calculate the length of the initial circle
+    for pos in range(count):
+        node[pos] = random_indices[pos]
+        next_pos[pos] = (pos + 1) % count
+        edge_length[pos] = distances.dist(random_indices[pos], random_indices[pos + 1])
+        W += edge_length[pos]
+    
+    # Sorted list of Not Processed nodes, so random choice behaves as in the list engine
+    unprocessed = [idx for idx in range(len(coords_list)) if status[idx] == "N"]
+    
+    while unprocessed:
+        
+        # Select random Not Processed node
+        u_idx = rng.choice(unprocessed)
+        del unprocessed[bisect_left(unprocessed, u_idx)]
+        
+        # Calculate distances between all nodes of the circuit and the current node
+        dist = distances.column(u_idx, node[:count])
+        next_dist = dist if distances.symmetric else distances.row(u_idx, node[:count])
+        next_dist = next_dist[next_pos[:count]]
+        sum_distances_from_u = dist + next_dist
+        
+        # Length increments of all edges, only edges shorter than the sum of distances are considered
+        delta = sum_distances_from_u - edge_length[:count]
+        valid = sum_distances_from_u > edge_length[:count]
+        valid[last] = False
+        
+        if valid.any():
+            delta = np.where(valid, delta, inf)
+        
+        ui_pos = int(np.argmin(delta))
+        delta_w = delta[ui_pos]
+        
+        # If more edges have the same increment, select the first one in the circuit as the list engine does
+        if np.count_nonzero(delta == delta_w) > 1:
+            pos = 0
+            while delta[pos] != delta_w:
+                pos = next_pos[pos]
+            ui_pos = pos
+        
+        # Add minimum length increment to W
+        W += delta_w
+        
+        # Insert current node after the selected position
+        node[count] = u_idx
+        next_pos[count] = next_pos[ui_pos]
+        edge_length[count] = next_dist[ui_pos]
+        next_pos[ui_pos] = count
+        edge_length[ui_pos] = dist[ui_pos]
+        status[u_idx] = "P"
+        count += 1
+    
+    # Walk through the linked list to create the circuit
+    order = np.empty(count, dtype = np.int32)
+    pos = 0
+    
+    for i in range(count):
+        order[i] = node[pos]
+        pos = next_pos[pos]
+    
+    return float(W), order
+
+def best_insertion(coords_list, reps, starting_node, separate_plots, engine = "linked", distances = None, rng = random):
     '''
     Best Insertion algorithm.
 
@@ -111,13 +712,26 @@ def best_insertion(coords_list, reps, starting_node, separate_plots):
                         repetitions will not yield different results.
             starting_node (int): Index of the starting node.
             separate_plots (bool): Specifies whether to draw separate plots for this algorithm.
+            engine (str): Specifies how nodes are inserted into the circuit.
+                          DEFAULT = "linked" (linked list with cached edge lengths, all edges evaluated at once)
+                          OPTIONAL = "list" (list of coordinates, edges evaluated one by one)
+            distances (provider): Distance provider used by the linked engine (see distance_provider).
+                                  DEFAULT = None (Euclidean distances calculated on demand)
+            rng (Random): Random number generator. DEFAULT = random (global state)
 
         Returns:
-            results (list): List of Hamiltonian circuits and their lengths.
+            results (list): List of Hamiltonian circuits (see Tour).
     '''
     
-    # Prepare results list
+    # Prepare results list and coordinates shared by all circuits
     results = []
+    points = tour_points(coords_list)
+    
+    if engine == "linked":
+        distances = distances if distances is not None else EuclideanDistances(coords_list)
+        
+    elif engine != "list":
+        sys.exit(f"Unknown engine {engine}.")
     
     # Repeat the algorithm number of reps times
     for rep in range(reps):
@@ -127,15 +741,15 @@ def best_insertion(coords_list, reps, starting_node, separate_plots):
         W = 0
         status = ["N"] * (len(coords_list))
         
-        # Prepare list for visualization of Hamiltonian circuit
-        circuit = []
+        # Prepare list of indices of nodes of Hamiltonian circuit
+        order = []
         
         # If starting node was not specified
         if starting_node == "unspecified":
             
             # Get random indices of three nodes
             # Append the first index again to form a circle
-            random_indices = random.sample(range(len(coords_list)), 3)
+            random_indices = rng.sample(range(len(coords_list)), 3)
             random_indices.append(random_indices[0])
         
         # If starting node was specified
@@ -143,36 +757,41 @@ def best_insertion(coords_list, reps, starting_node, separate_plots):
             
             # Get random indices of three nodes again but replace the first index
             # with starting node index
-            random_indices = random.sample(range(len(coords_list)), 3)
+            random_indices = rng.sample(range(len(coords_list)), 3)
             random_indices[0] = starting_node
             random_indices.append(starting_node)
         
         # Append nodes to Hamiltonian circuit using prepared indices
         # Set their status to Processed
         for idx in random_indices:
-            circuit.append(coords_list[idx])
+            order.append(idx)
             status[idx] = 'P'
         
         # Calculate the length of the circle
-        for point, next_point in zip(circuit, circuit[1:]):
+        for idx, next_idx in zip(order, order[1:]):
+            point, next_point = coords_list[idx], coords_list[next_idx]
             dist = euclidean_dist(point[0], point[1], next_point[0], next_point[1])
             W += dist
+        
+        # Insert all Not Processed nodes using the linked list
+        if engine == "linked":
+            W, order = _insert_linked(coords_list, distances, random_indices, status, rng)
             
         # While any Not Processed nodes exist 
-        while "N" in status:
+        while engine == "list" and "N" in status:
             
             # Select random Not Processed node
             # Initialize the minimum length increment to infinity
-            u_idx = random.choice([idx for idx in range(len(coords_list)) if status[idx] == "N"])
+            u_idx = rng.choice([idx for idx in range(len(coords_list)) if status[idx] == "N"])
             u = coords_list[u_idx]
             delta_w = inf
             
             # For all nodes except last two (to avoid working with the starting node)
-            for distance in range(len(circuit) - 2):
+            for distance in range(len(order) - 2):
                 
                 # Get two consecutive nodes
-                ui = circuit[distance]
-                uj = circuit[distance + 1]
+                ui = coords_list[order[distance]]
+                uj = coords_list[order[distance + 1]]
                 
                 # Calculate their distance
                 ui_uj_dist = euclidean_dist(ui[0], ui[1], uj[0], uj[1])
@@ -195,23 +814,219 @@ def best_insertion(coords_list, reps, starting_node, separate_plots):
             W += delta_w
             
             # Insert current node between nodes forming the selected path
-            circuit.insert((ui_idx + 1), u)
+            order.insert((ui_idx + 1), u_idx)
             
             # Set the status of current node to Processed
             status[u_idx] = "P"
         
-        # Append length W and Hamiltonian circuit
-        results.append([W, circuit])
+        # Append Hamiltonian circuit (without the repeated starting node of the list engine) with its length W
+        results.append(Tour(order if engine == "linked" else order[:-1], points, W))
 
         if separate_plots:
-            plt.plot([coord[0] for coord in circuit], [coord[1] for coord in circuit], c="black", linewidth=1)
-            plt.scatter([coord[0] for coord in coords_list], [coord[1] for coord in coords_list], s=20, c = "white", edgecolors = "black")
-            plt.scatter(circuit[0][0], circuit[0][1], s=40, c = "red", edgecolors = "red")
-            plt.title("Best Insertion method, W = {} km".format(round(W/1000, 2)))
+            _draw_tour(plt.gca(), results[-1], "Best Insertion method", coords_list)
             plt.show()
     
     return results
         
+class _JSONStream:
+    '''
+    Text of a JSON file read in chunks, from which whole JSON values are decoded one by one.
+
+        Parameters:
+            jsonfile (file): File opened in text mode.
+            chunk_size (int): Number of characters read at once.
+    '''
+
+    WHITESPACE = re.compile(r"\s*")
+
+    def __init__(self, jsonfile, chunk_size):
+        self.jsonfile = jsonfile
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.offset = 0
+        self.eof = False
+
+    def fill(self):
+        '''Drops the consumed part of the buffer and reads the next chunk. Returns False at the end of the file.'''
+        if self.eof:
+            return False
+
+        chunk = self.jsonfile.read(self.chunk_size)
+        self.offset += self.pos
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+        return not self.eof
+
+    def peek(self):
+        '''Skips whitespace and returns the next character ("" at the end of the file).'''
+        while True:
+            self.pos = self.WHITESPACE.match(self.buffer, self.pos).end()
+
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, characters):
+        '''Consumes the next character, which has to be one of characters, and returns it.'''
+        character = self.peek()
+
+        if not character or character not in characters:
+            raise ValueError(f"expected one of {characters!r} at character {self.offset + self.pos}")
+
+        self.pos += 1
+        return character
+
+    def value(self):
+        '''Decodes the next JSON value, reading further chunks while the value is incomplete.'''
+        self.peek()
+
+        while True:
+            # A value ending exactly at the end of the buffer (e.g. a number) may continue in the next chunk
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+
+            # Positions in the error are relative to the buffer
+            except JSONDecodeError as error:
+                if self.eof:
+                    raise ValueError(f"{error.msg} at character {self.offset + error.pos}") from None
+
+            self.fill()
+
+def _parse_coordinates(filename, chunk_size = 1 << 24):
+    '''
+    Parses coordinates of Point geometries from a GeoJSON file read in chunks.
+    Features are decoded one by one, so the whole file is validated without loading it into memory.
+
+        Parameters:
+            filename (file): A JSON file containing geographical coordinates.
+            chunk_size (int): Number of characters read at once. DEFAULT = 16 M
+
+        Returns:
+            coordinates (array): Contiguous (n, 2) float64 array of coordinates.
+
+        Raises:
+            ValueError: The file is not valid JSON, has no "features" array or a feature is not a Point.
+    '''
+
+    coordinates = np.empty((1024, 2))
+    count = 0
+    found = False
+
+    with open(filename, encoding = "utf-8") as jsonfile:
+        stream = _JSONStream(jsonfile, chunk_size)
+        stream.expect("{")
+        separator = "," if stream.peek() != "}" else stream.expect("}")
+
+        # Members of the top-level object, only the "features" array is decoded feature by feature
+        while separator == ",":
+            key = stream.value()
+
+            if not isinstance(key, str):
+                raise ValueError(f"expected a key at character {stream.offset + stream.pos}")
+
+            stream.expect(":")
+
+            if key != "features":
+                stream.value()
+                separator = stream.expect(",}")
+                continue
+
+            found = True
+            stream.expect("[")
+            delimiter = "," if stream.peek() != "]" else stream.expect("]")
+
+            while delimiter == ",":
+                feature = stream.value()
+
+                try:
+                    geometry = feature["geometry"]
+                    point = geometry["coordinates"][:2] if geometry["type"] == "Point" else None
+
+                except (KeyError, TypeError):
+                    point = None
+
+                if point is None or len(point) != 2:
+                    raise ValueError(f"feature {count + 1} is not a Point")
+
+                # Grow the array by doubling its size
+                if count == len(coordinates):
+                    coordinates = np.resize(coordinates, (2 * len(coordinates), 2))
+
+                coordinates[count] = point
+                count += 1
+                delimiter = stream.expect(",]")
+
+            separator = stream.expect(",}")
+
+        # Nothing but whitespace may follow the top-level object
+        if stream.peek():
+            raise ValueError(f"extra data at character {stream.offset + stream.pos}")
+
+    if not found:
+        raise ValueError("missing features")
+
+    return np.ascontiguousarray(coordinates[:count])
+
+def load_coordinates_array(filename, cache = True):
+    '''
+    Loads coordinates (nodes) from input GeoJSON file into an array without loading the whole file into memory.
+    Parsed coordinates are stored in a .npy file next to the input file and reused
+    while the modification time of the input file does not change.
+
+        Parameters:
+            filename (file): A JSON file containing geographical coordinates.
+            cache (bool): Specifies whether to use and create the .npy file. DEFAULT = True
+
+        Returns:
+            coordinates (array): Contiguous (n, 2) float64 array of coordinates.
+    '''
+    
+    cachename = f"{filename}.coords.npy"
+    
+    try:
+        source_mtime = os.stat(filename).st_mtime_ns
+        
+        # The cache file gets the modification time of the input file when it is created
+        if cache and os.path.exists(cachename) and os.stat(cachename).st_mtime_ns == source_mtime:
+            return np.load(cachename)
+        
+        coordinates = _parse_coordinates(filename)
+    
+    except FileNotFoundError:
+        sys.exit(f"File {filename} not found.")
+        
+    except PermissionError:
+        sys.exit(f"{filename}: Permission denied.")
+
+    except IOError:
+        sys.exit(f"{filename}: Incorrect file name or location.")
+    
+    # JSONDecodeError is a ValueError as well, the cache is written only after the whole file was parsed
+    except ValueError as error:
+        sys.exit(f"{filename}: Invalid JSON file ({error}).")
+    
+    if len(coordinates) == 0:
+        sys.exit(f"{filename}: Invalid JSON file.")
+    
+    if cache:
+        try:
+            temporary = f"{cachename}.{os.getpid()}.tmp.npy"
+            np.save(temporary, coordinates)
+            os.utime(temporary, ns = (source_mtime, source_mtime))
+            os.replace(temporary, cachename)
+        
+        # The cache is optional, e.g. the directory may be read-only
+        except OSError:
+            pass
+        
+    return coordinates
+
 def load_coordinates(filename):
     '''
     Loads coordinates (nodes) from input JSON file.
@@ -244,6 +1059,38 @@ def load_coordinates(filename):
     except JSONDecodeError:
         sys.exit(f"{filename}: Invalid JSON file.")
 
+def _draw_tour(ax, result, title, coords_list = None):
+    '''
+    Draws a Hamiltonian circuit as a single line collection.
+
+        Parameters:
+            ax (Axes): Axes the circuit is drawn to.
+            result (Tour or list): Tour or result [W, circuit] of an algorithm.
+            title (str): Name of the algorithm (length of the circuit is appended).
+            coords_list (list): Nodes drawn as points. DEFAULT = None (nodes of the circuit)
+    '''
+    
+    points = result.coordinates() if isinstance(result, Tour) else np.asarray(result[1], dtype = float)[:, :2]
+    nodes = np.asarray(coords_list, dtype = float)[:, :2] if coords_list is not None else points
+    
+    # Segments between consecutive nodes of the circuit, shape (n, 2, 2)
+    ax.add_collection(LineCollection(np.stack((points[:-1], points[1:]), axis = 1), colors = "black", linewidths = 1))
+    ax.scatter(nodes[:, 0], nodes[:, 1], s=20, c = "white", edgecolors = "black")
+    ax.scatter(points[0, 0], points[0, 1], s=40, c = "red", edgecolors = "red")
+    ax.set_title("{}, W = {} km".format(title, round(result[0]/1000, 2)))
+    ax.autoscale_view()
+
+def _draw_comparison(fig, NN_result, BI_result, title):
+    '''Draws results of NN and BI algorithms next to each other.'''
+    
+    ax1, ax2 = fig.subplots(1, 2)
+    fig.suptitle(title, fontsize = 20)
+    
+    for ax, result, name in ((ax1, NN_result, "Nearest Neighbor method"), (ax2, BI_result, "Best Insertion method")):
+        _draw_tour(ax, result, name)
+        ax.get_xaxis().set_visible(False)
+        ax.get_yaxis().set_visible(False)
+
 def visualize_comparison(NN_results, BI_results, reps):
     '''
     Visualize both NN and BI algorithms next to each other for comparison.
@@ -255,23 +1102,107 @@ def visualize_comparison(NN_results, BI_results, reps):
     
     # Create comparison plots for each repetition
     for rep in range(reps):
-        fig, (ax1, ax2) = plt.subplots(1, 2)
-        fig.suptitle("Travelling Salesman Problem, repetition number: {}".format(rep + 1), fontsize = 20)
-        ax1.plot([coord[0] for coord in NN_results[rep][1]], [coord[1] for coord in NN_results[rep][1]], c="black", linewidth=1)
-        ax1.scatter([coord[0] for coord in NN_results[rep][1]], [coord[1] for coord in NN_results[rep][1]], s=20, c = "white", edgecolors = "black")
-        ax1.scatter(NN_results[rep][1][0][0], NN_results[rep][1][0][1], s=40, c = "red", edgecolors = "red")
-        ax1.set_title("Nearest Neighbor method, W = {} km".format(round(NN_results[rep][0]/1000, 2)))
-        ax1.get_xaxis().set_visible(False)
-        ax1.get_yaxis().set_visible(False)
-        ax2.plot([coord[0] for coord in BI_results[rep][1]], [coord[1] for coord in BI_results[rep][1]], c="black", linewidth=1)
-        ax2.scatter([coord[0] for coord in BI_results[rep][1]], [coord[1] for coord in BI_results[rep][1]], s=20, c = "white", edgecolors = "black")
-        ax2.scatter(BI_results[rep][1][0][0], BI_results[rep][1][0][1], s=40, c = "red", edgecolors = "red")
-        ax2.set_title("Best Insertion method, W = {} km".format(round(BI_results[rep][0]/1000, 2)))
-        ax2.get_xaxis().set_visible(False)
-        ax2.get_yaxis().set_visible(False)
+        _draw_comparison(plt.figure(), NN_results[rep], BI_results[rep],
+                         "Travelling Salesman Problem, repetition number: {}".format(rep + 1))
         plt.show()
 
-def TSP(coords_list, reps = 10, algorithm = "all", starting_node = "unspecified", separate_plots = False):
+class TourRenderer:
+    '''
+    Saves plots of the shortest circuits to image files without GUI (non-interactive Agg backend).
+    Figures are drawn by a background thread, so the algorithms keep running while the plots are rendered.
+
+        Parameters:
+            outdir (str): Directory of the image files. DEFAULT = "plots"
+            best (int): Number of the shortest circuits rendered of every algorithm. DEFAULT = 3
+            fmt (str): Format of the image files. DEFAULT = "png"
+            dpi (int): Resolution of the image files. DEFAULT = 100
+    '''
+    
+    def __init__(self, outdir = "plots", best = 3, fmt = "png", dpi = 100):
+        os.makedirs(outdir, exist_ok = True)
+        self.outdir = outdir
+        self.best = best
+        self.fmt = fmt
+        self.dpi = dpi
+        self.executor = ThreadPoolExecutor(max_workers = 1)
+        self.futures = []
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def shortest(self, results):
+        '''Returns the best shortest results sorted by length.'''
+        return sorted(results, key = lambda result: result.length)[:self.best]
+    
+    def save(self, fig, name):
+        '''Renders a figure to a file in the output directory and returns its path.'''
+        path = os.path.join(self.outdir, f"{name}.{self.fmt}")
+        FigureCanvasAgg(fig)
+        fig.savefig(path, dpi = self.dpi)
+        return path
+    
+    def _tours(self, results, name, title):
+        paths = []
+        
+        for rank, result in enumerate(results, 1):
+            fig = Figure()
+            _draw_tour(fig.add_subplot(), result, title)
+            paths.append(self.save(fig, f"{name}_{rank}"))
+            
+        return paths
+    
+    def _comparisons(self, NN_results, BI_results):
+        paths = []
+        
+        for rank, (NN_result, BI_result) in enumerate(zip(NN_results, BI_results), 1):
+            fig = Figure(figsize = (12.8, 4.8))
+            _draw_comparison(fig, NN_result, BI_result, "Travelling Salesman Problem, rank: {}".format(rank))
+            paths.append(self.save(fig, f"comparison_{rank}"))
+            
+        return paths
+    
+    def render_tours(self, results, name, title):
+        '''
+        Queues plots of the shortest results of an algorithm, saved as <name>_<rank>.<fmt>.
+
+            Parameters:
+                results (list): List of results of the algorithm.
+                name (str): Prefix of the file names.
+                title (str): Name of the algorithm shown in the plots.
+        '''
+        
+        self.futures.append(self.executor.submit(self._tours, self.shortest(results), name, title))
+    
+    def render_comparison(self, NN_results, BI_results):
+        '''
+        Queues comparison plots of the shortest results of NN and BI algorithms, saved as comparison_<rank>.<fmt>.
+        The k-th shortest NN circuit is shown next to the k-th shortest BI circuit.
+
+            Parameters:
+                NN_results (list): List of results of NN algorithm.
+                BI_results (list): List of results of BI algorithm.
+        '''
+        
+        self.futures.append(self.executor.submit(self._comparisons, self.shortest(NN_results), self.shortest(BI_results)))
+    
+    def close(self):
+        '''
+        Waits until all queued plots are saved.
+
+            Returns:
+                paths (list): Paths of all saved image files.
+        '''
+        
+        self.executor.shutdown(wait = True)
+        paths = [path for future in self.futures for path in future.result()]
+        self.futures = []
+        return paths
+
+def TSP(coords_list, reps = 10, algorithm = "all", starting_node = "unspecified", separate_plots = False, distances = None,
+        improve = None, render = "show", outdir = "plots", best = 3):
     '''
     Specifies conditions on which the script runs.
 
@@ -283,35 +1214,937 @@ def TSP(coords_list, reps = 10, algorithm = "all", starting_node = "unspecified"
             starting_node (int): Specifies the starting node. DEFAULT = "unspecified".
             separate_plots (bool): Specifies whether to draw separate plots for NN and BI algorithms.
                                    DEFAULT = False
+            distances (str or provider): Distances shared by all repetitions of both algorithms (see distance_provider).
+                                         DEFAULT = None (Euclidean distances, nearest nodes found using k-d tree)
+            improve (float): Time budget in seconds for improving every circuit by 2-opt and Or-opt moves
+                             (see improve_tour). DEFAULT = None (circuits are not improved)
+            render (str): Specifies how the results are plotted. DEFAULT = "show" (window for every repetition)
+                          OPTIONAL = "files" (best circuits saved to outdir without GUI, see TourRenderer); None (no plots)
+            outdir (str): Directory of the image files of render = "files". DEFAULT = "plots"
+            best (int): Number of the shortest circuits of every algorithm saved by render = "files". DEFAULT = 3
 
         Returns:
             DEFAULT
-            NN_results, BI_results (tuple): Tuple containing all results from both algorithms.
+            NN_results, BI_results (tuple): Tuple containing all results (see Tour) from both algorithms.
             
             OPTIONAL
-            NN_results (list): List of results of all repetitions of NN algorithm.
-            BI_results (list): List of results of all repetitions of BI algorithm.
+            NN_results (list): List of results (see Tour) of all repetitions of NN algorithm.
+            BI_results (list): List of results (see Tour) of all repetitions of BI algorithm.
     '''
     
+    if render not in ("show", "files", None) or algorithm not in ("all", "NN", "BI"):
+        sys.exit("Unknown parameters. The script will now terminate.")
+    
+    # Create the distance provider once for all repetitions
+    if distances is not None:
+        distances = distance_provider(coords_list, distances)
+    
+    # Find the nearest nodes used by the improvement once for all circuits
+    if improve is not None:
+        neighbors = neighbor_lists(coords_list)
+        improved = lambda results: [improve_tour(coords_list, result, improve, neighbors)[0] for result in results]
+    else:
+        improved = lambda results: results
+    
+    # Separate plots of render = "files" are saved by the renderer instead of shown by the algorithms
+    renderer = TourRenderer(outdir, best) if render == "files" else None
+    show_separate = separate_plots and render == "show"
+    results = {}
+    
+    try:
+        for name, solver, title in (("NN", nearest_neighbor, "Nearest Neighbor method"),
+                                    ("BI", best_insertion, "Best Insertion method")):
+            if algorithm in ("all", name):
+                results[name] = improved(solver(coords_list, reps, starting_node, show_separate, distances = distances))
+                
+                # Single algorithm runs have no comparison plots, so their best circuits are always saved
+                if renderer is not None and (separate_plots or algorithm == name):
+                    renderer.render_tours(results[name], name, title)
+        
+        if algorithm == "all":
+            if render == "show":
+                visualize_comparison(results["NN"], results["BI"], reps)
+            elif renderer is not None:
+                renderer.render_comparison(results["NN"], results["BI"])
+    
+    finally:
+        if renderer is not None:
+            renderer.close()
+    
     if algorithm == "all":
-        NN_results = nearest_neighbor(coords_list, reps, starting_node, separate_plots)
-        BI_results = best_insertion(coords_list, reps, starting_node, separate_plots)
-        visualize_comparison(NN_results, BI_results, reps)
-        return NN_results, BI_results
+        return results["NN"], results["BI"]
+    
+    return results[algorithm]
+
+class _LocalSearch:
+    '''
+    2-opt and Or-opt improvement of a circuit stored as a doubly linked list of node indices.
+    Only moves connecting a node with one of its nearest neighbors are evaluated
+    and nodes whose surroundings did not change since their last evaluation are skipped (don't-look bits).
+    Moves change the links in place and the time does not depend on the number of nodes
+    (except for reversals of long paths by 2-opt moves).
+
+        Parameters:
+            xs, ys (list): Coordinates of nodes.
+            nxt, prv (list): Following and preceding node of every node of the circuit (changed in place).
+            count (int): Number of nodes of the circuit.
+            neighbors (list or function): Lists of indices of the nearest nodes of every node sorted by distance,
+                                          or function returning the list of a node.
+    '''
+    
+    # Minimum gain of an applied move (avoids cycling on rounding errors)
+    EPS = 1e-7
+    
+    def __init__(self, xs, ys, nxt, prv, count, neighbors):
+        self.xs = xs
+        self.ys = ys
+        self.nxt = nxt
+        self.prv = prv
+        self.count = count
+        self.neighbors = neighbors if callable(neighbors) else neighbors.__getitem__
+        self.gain = 0.0
+        self.two_opt_moves = 0
+        self.or_opt_moves = 0
+    
+    @classmethod
+    def from_order(cls, coords_list, order, neighbors):
+        '''Creates the search of a circuit given by indices of nodes in order of the circuit.'''
+        nxt = [-1] * len(coords_list)
+        prv = [-1] * len(coords_list)
+        
+        for pos, node in enumerate(order):
+            nxt[node] = order[(pos + 1) % len(order)]
+            prv[node] = order[pos - 1]
+        
+        return cls([coord[0] for coord in coords_list], [coord[1] for coord in coords_list], nxt, prv, len(order), neighbors)
+    
+    def dist(self, a, b):
+        return euclidean_dist(self.xs[a], self.ys[a], self.xs[b], self.ys[b])
+    
+    def walk(self, head):
+        '''Returns indices of nodes in order of the circuit starting at node head.'''
+        order = []
+        node = head
+        
+        for _ in range(self.count):
+            order.append(node)
+            node = self.nxt[node]
+            
+        return order
+    
+    def reverse(self, a, b, nxt, prv):
+        '''Reverses the path from node a to node b (following nxt) by swapping links of its nodes.'''
+        node = a
+        
+        while True:
+            following = nxt[node]
+            nxt[node], prv[node] = prv[node], following
+            
+            if node == b:
+                return
+            
+            node = following
+    
+    def two_opt(self, a, nxt, prv):
+        '''
+        Tries to replace edge (a, nxt[a]) and another edge by two shorter edges.
+        The shorter of the two paths between the replaced edges is reversed, both are walked at once to find it.
+        Returns changed nodes.
+        '''
+        
+        b = nxt[a]
+        d_ab = self.dist(a, b)
+        
+        for c in self.neighbors(a):
+            d_ac = self.dist(a, c)
+            
+            # Neighbors are sorted by distance, farther ones cannot give a shorter circuit
+            if d_ac >= d_ab:
+                break
+            
+            d = nxt[c]
+            
+            if c == b or d == a:
+                continue
+            
+            gain = d_ab + self.dist(c, d) - d_ac - self.dist(b, d)
+            
+            if gain > self.EPS:
+                
+                # Circuit a b ... c d ... a becomes a c ... b d ... a
+                forward, backward = b, d
+                while forward != c and backward != a:
+                    forward, backward = nxt[forward], nxt[backward]
+                
+                if forward == c:
+                    self.reverse(b, c, nxt, prv)
+                    nxt[a], prv[c], nxt[b], prv[d] = c, a, d, b
+                else:
+                    self.reverse(d, a, nxt, prv)
+                    nxt[c], prv[a], nxt[d], prv[b] = a, c, b, d
+                
+                self.gain += gain
+                self.two_opt_moves += 1
+                return (a, b, c, d)
+            
+        return ()
     
-    elif algorithm == "NN":
-        NN_results = nearest_neighbor(coords, reps, starting_node, separate_plots)
-        return NN_results
+    def or_opt(self, a):
+        '''Tries to move a path of 1 to 3 nodes starting at node a between two other nodes. Returns changed nodes.'''
+        nxt, prv = self.nxt, self.prv
+        
+        for length in (1, 2, 3):
+            if self.count < length + 3:
+                break
+            
+            segment = [a]
+            for _ in range(length - 1):
+                segment.append(nxt[segment[-1]])
+            
+            e = segment[-1]
+            p, f = prv[a], nxt[e]
+            removal_gain = self.dist(p, a) + self.dist(e, f) - self.dist(p, f)
+            
+            if removal_gain <= self.EPS:
+                continue
+            
+            for c in self.neighbors(a) + self.neighbors(e):
+                if c in segment:
+                    continue
+                
+                for x, y in ((c, nxt[c]), (prv[c], c)):
+                    if x in segment or y in segment:
+                        continue
+                    
+                    d_xy = self.dist(x, y)
+                    keep = self.dist(x, a) + self.dist(e, y) - d_xy
+                    flip = self.dist(x, e) + self.dist(a, y) - d_xy
+                    
+                    if removal_gain - min(keep, flip) > self.EPS:
+                        
+                        # Unlink the segment and insert it between x and y
+                        nxt[p], prv[f] = f, p
+                        
+                        if keep <= flip:
+                            nxt[x], prv[a], nxt[e], prv[y] = a, x, y, e
+                        else:
+                            self.reverse(a, e, nxt, prv)
+                            nxt[x], prv[e], nxt[a], prv[y] = e, x, y, a
+                        
+                        self.gain += removal_gain - min(keep, flip)
+                        self.or_opt_moves += 1
+                        return (p, f, x, y, a, e)
+                    
+        return ()
     
-    elif algorithm == "BI":
-        BI_results = best_insertion(coords, reps, starting_node, separate_plots)
-        return BI_results
+    def run(self, active, time_budget, or_opt = True):
+        '''
+        Applies improving moves until no move is found or the time budget is exceeded.
+
+            Parameters:
+                active (list): Nodes evaluated first (all other nodes are skipped until a move changes them).
+                time_budget (float): Maximum time in seconds.
+                or_opt (bool): Specifies whether to apply Or-opt moves. DEFAULT = True
+
+            Returns:
+                timed_out (bool): True if the search was stopped by the time budget.
+        '''
+        
+        deadline = time.perf_counter() + time_budget
+        queue = deque(dict.fromkeys(active))
+        queued = set(queue)
+        
+        if self.count < 5:
+            return False
+        
+        while queue:
+            if time.perf_counter() > deadline:
+                return True
+            
+            a = queue.popleft()
+            queued.discard(a)
+            
+            # Both directions are evaluated by swapping the roles of the links
+            changed = (self.two_opt(a, self.nxt, self.prv) or self.two_opt(a, self.prv, self.nxt)
+                       or (self.or_opt(a) if or_opt else ()))
+            
+            # Reset the don't-look bits of the nodes whose edges were changed
+            for node in changed:
+                if node not in queued:
+                    queue.append(node)
+                    queued.add(node)
+                    
+        return False
+
+def neighbor_lists(coords_list, k = 8, tree = None):
+    '''
+    Finds k nearest nodes of every node.
+
+        Parameters:
+            coords_list (list): List of coordinations of nodes.
+            k (int): Number of nearest nodes. DEFAULT = 8
+            tree (KDTree): k-d tree of the nodes. DEFAULT = None (a new tree is built)
+
+        Returns:
+            neighbors (list): Lists of indices of the nearest nodes of every node sorted by distance.
+    '''
+    
+    tree = tree if tree is not None else KDTree(coords_list)
+    tree.reset()
+    return [[idx for _, idx in tree.nearest_k(coord[0], coord[1], k + 1) if idx != node][:k]
+            for node, coord in enumerate(coords_list)]
+
+def circuit_indices(coords_list, circuit):
+    '''
+    Converts circuit of coordinates to indices of nodes (without returning to the first node).
+
+        Parameters:
+            coords_list (list): List of coordinations of nodes.
+            circuit (Tour or list): Tour or Hamiltonian circuit (list of coordinates ending with the first node).
+
+        Returns:
+            tour (list): Indices of nodes in order of the circuit.
+
+        Raises:
+            ValueError: The circuit does not visit every node of coords_list exactly once.
+    '''
+    
+    if isinstance(circuit, Tour):
+        tour = circuit.order.tolist()
     
     else:
+        # Circuits created by the algorithms contain the objects of coords_list, copies are matched by value
+        same = {id(coord) for coord in coords_list}
+        key = id if all(id(coord) in same for coord in circuit) else tuple
+        
+        # Every occurrence of equal coordinates takes the next unused index of them
+        indices = {}
+        for idx, coord in enumerate(coords_list):
+            indices.setdefault(key(coord), deque()).append(idx)
+        
+        tour = []
+        for coord in circuit[:-1]:
+            if not indices.get(key(coord)):
+                raise ValueError(f"Node {coord} is not in coords_list or is visited more than once.")
+            
+            tour.append(indices[key(coord)].popleft())
+    
+    if len(tour) != len(coords_list) or len(set(tour)) != len(tour):
+        raise ValueError("The circuit is not a permutation of the nodes.")
+    
+    return tour
+
+def improve_tour(coords_list, result, time_budget = 10.0, neighbors = 8, or_opt = True):
+    '''
+    Improves a Hamiltonian circuit created by any algorithm using 2-opt and Or-opt moves.
+
+        Parameters:
+            coords_list (list): List of coordinations of nodes.
+            result (Tour or list): Tour or result [W, circuit] created by any algorithm.
+            time_budget (float): Maximum time of the improvement in seconds. DEFAULT = 10.0
+            neighbors (int or list): Number of nearest nodes evaluated for every node,
+                                     or precomputed lists of them (see neighbor_lists). DEFAULT = 8
+            or_opt (bool): Specifies whether to apply Or-opt moves after 2-opt moves. DEFAULT = True
+
+        Returns:
+            result, report (tuple): Improved circuit (see Tour) and dictionary describing the improvement
+                                    ("initial", "final", "improvement", "improvement_pct", "two_opt_moves",
+                                    "or_opt_moves", "seconds", "timed_out").
+    '''
+    
+    start = time.perf_counter()
+    tour = circuit_indices(coords_list, result if isinstance(result, Tour) else result[1])
+    points = result.points if isinstance(result, Tour) else tour_points(coords_list)
+    
+    if isinstance(neighbors, int):
+        neighbors = neighbor_lists(coords_list, neighbors)
+    
+    search = _LocalSearch.from_order(coords_list, tour, neighbors)
+    initial = result.length if isinstance(result, Tour) else Tour(tour, points).length
+    timed_out = search.run(tour, max(time_budget - (time.perf_counter() - start), 0), or_opt)
+    
+    # Walk the circuit from the original starting node
+    improved = Tour(search.walk(tour[0]) if tour else tour, points)
+    final = improved.length
+    
+    report = {"initial": initial, "final": final, "improvement": initial - final,
+              "improvement_pct": 100 * (initial - final) / initial if initial else 0.0,
+              "two_opt_moves": search.two_opt_moves, "or_opt_moves": search.or_opt_moves,
+              "seconds": time.perf_counter() - start, "timed_out": timed_out}
+    
+    return improved, report
+
+def _multistart_init(coords_list, distances):
+    '''Stores the nodes and the distance provider in a worker process of multistart.'''
+    global _worker_coords, _worker_distances
+    _worker_coords = coords_list
+    _worker_distances = distance_provider(coords_list, distances) if distances is not None else None
+
+def _multistart_chunk(algorithm, chunk, reps, starting_node, seed):
+    '''
+    Runs a chunk of repetitions of an algorithm in a worker process of multistart.
+
+        Parameters:
+            algorithm (str): "NN" (Nearest Neighbor) or "BI" (Best Insertion).
+            chunk (int): Number of the chunk, used to derive its seed.
+            reps (int): Number of repetitions in the chunk.
+            starting_node (int): Index of the starting node.
+            seed (int): Seed of the whole run.
+
+        Returns:
+            lengths, best (tuple): Lengths of all circuits and the shortest circuit (see Tour).
+    '''
+    
+    # Every chunk has its own generator, so the results do not depend on the number of processes
+    rng = random.Random(f"{seed}:{algorithm}:{chunk}")
+    solver = nearest_neighbor if algorithm == "NN" else best_insertion
+    results = solver(_worker_coords, reps, starting_node, False, distances = _worker_distances, rng = rng)
+    return [result.length for result in results], min(results, key = lambda result: result.length)
+
+def multistart(coords_list, reps = 100, algorithms = ("NN", "BI"), starting_node = "unspecified", workers = None,
+               seed = 0, chunk_size = 10, distances = None):
+    '''
+    Runs many repetitions of both algorithms in parallel and keeps only the best circuits.
+    Repetitions are split into chunks with seeds derived from the seed of the run,
+    so the same seed and chunk size always give the same results.
+
+        Parameters:
+            coords_list (list): List of coordinations of nodes.
+            reps (int): Number of repetitions of each algorithm. DEFAULT = 100
+            algorithms (tuple): Algorithms to run. DEFAULT = ("NN", "BI")
+            starting_node (int): Index of the starting node. DEFAULT = "unspecified"
+            workers (int): Number of processes. DEFAULT = None (number of processors)
+            seed (int): Seed of the random number generators. DEFAULT = 0
+            chunk_size (int): Number of repetitions run by a process at once. DEFAULT = 10
+            distances (str): Distances built once in every process (see distance_provider). DEFAULT = None
+
+        Returns:
+            summary (dict): For every algorithm, the best circuit (see Tour) and statistics of lengths
+                            ("reps", "min", "mean", "max", "std"). The best result of all algorithms is stored as "best".
+    '''
+    
+    if not algorithms:
+        sys.exit("No algorithm specified.")
+
+    for algorithm in algorithms:
+        if algorithm not in ("NN", "BI"):
+            sys.exit(f"Unknown algorithm {algorithm}.")
+
+    if reps < 1:
+        sys.exit(f"Invalid number of repetitions {reps}.")
+
+    if chunk_size < 1:
+        sys.exit(f"Invalid chunk size {chunk_size}.")
+
+    tasks = [(algorithm, chunk, min(chunk_size, reps - start))
+             for algorithm in algorithms for chunk, start in enumerate(range(0, reps, chunk_size))]
+    summary = {}
+    
+    with ProcessPoolExecutor(max_workers = workers, initializer = _multistart_init, initargs = (coords_list, distances)) as executor:
+        futures = [executor.submit(_multistart_chunk, algorithm, chunk, chunk_reps, starting_node, seed)
+                   for algorithm, chunk, chunk_reps in tasks]
+        
+        # Keep only the lengths and the best circuit of every algorithm
+        for (algorithm, _, _), future in zip(tasks, futures):
+            lengths, best = future.result()
+            entry = summary.setdefault(algorithm, {"best": best, "lengths": []})
+            entry["lengths"].extend(lengths)
+            
+            if best.length < entry["best"].length:
+                entry["best"] = best
+    
+    for algorithm, entry in summary.items():
+        lengths = np.array(entry.pop("lengths"))
+        entry.update(reps = len(lengths), min = float(lengths.min()), mean = float(lengths.mean()),
+                     max = float(lengths.max()), std = float(lengths.std()))
+    
+    summary["best"] = min((summary[algorithm]["best"] for algorithm in algorithms), key = lambda result: result.length)
+    return summary
+
+def grid_clusters(points, clusters):
+    '''
+    Partitions nodes into cells of a regular grid covering their bounding box.
+
+        Parameters:
+            points (array): Coordinates of nodes, shape (n, 2).
+            clusters (int): Approximate number of cells (cells are close to squares, empty cells are dropped).
+
+        Returns:
+            labels (array): Index of the cluster of every node.
+    '''
+    
+    low = points.min(axis = 0)
+    extent = np.maximum(points.max(axis = 0) - low, 1e-9)
+    
+    # Split the longer side into more cells, so the cells are close to squares
+    columns = max(int(round(sqrt(clusters * extent[0] / extent[1]))), 1)
+    rows = max(-(-clusters // columns), 1)
+    cells = np.minimum(((points - low) / extent * (columns, rows)).astype(np.int64), (columns - 1, rows - 1))
+    
+    # Number the non-empty cells consecutively
+    return np.unique(cells[:, 1] * columns + cells[:, 0], return_inverse = True)[1].astype(np.int32)
+
+def kmeans_clusters(points, clusters, iterations = 10, seed = 0, chunk_size = 8192):
+    '''
+    Partitions nodes by k-means (Lloyd's algorithm) initialized with randomly chosen nodes.
+
+        Parameters:
+            points (array): Coordinates of nodes, shape (n, 2).
+            clusters (int): Number of clusters (empty clusters are dropped).
+            iterations (int): Number of iterations. DEFAULT = 10
+            seed (int): Seed of the random number generator. DEFAULT = 0
+            chunk_size (int): Number of nodes assigned to the centroids at once. DEFAULT = 8192
+
+        Returns:
+            labels (array): Index of the cluster of every node.
+    '''
+    
+    rng = np.random.default_rng(seed)
+    centroids = points[rng.choice(len(points), min(clusters, len(points)), replace = False)]
+    labels = np.zeros(len(points), dtype = np.int32)
+    
+    for _ in range(iterations):
+        
+        # Assign nodes to the nearest centroids in chunks (distance matrix of all nodes does not fit in memory)
+        centroid_norms = (centroids ** 2).sum(axis = 1)
+        
+        for start in range(0, len(points), chunk_size):
+            chunk = points[start:start + chunk_size]
+            labels[start:start + chunk_size] = np.argmin(centroid_norms - 2 * chunk @ centroids.T, axis = 1)
+        
+        # Move centroids to the means of their nodes, empty clusters keep their centroids
+        counts = np.bincount(labels, minlength = len(centroids))
+        sums = np.stack([np.bincount(labels, points[:, axis], len(centroids)) for axis in (0, 1)], axis = 1)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        
+    return np.unique(labels, return_inverse = True)[1].astype(np.int32)
+
+def _solve_cluster(algorithm, cluster, coords, seed):
+    '''
+    Solves a cluster of decompose in a worker process.
+
+        Parameters:
+            algorithm (str): "NN" (Nearest Neighbor) or "BI" (Best Insertion).
+            cluster (int): Index of the cluster, used to derive its seed.
+            coords (list): Coordinates of nodes of the cluster.
+            seed (int): Seed of the whole run.
+
+        Returns:
+            order (array): Indices of nodes of the cluster in order of its circuit.
+    '''
+    
+    # Best Insertion needs at least three nodes, order of smaller clusters does not matter
+    if len(coords) < 4:
+        return np.arange(len(coords), dtype = np.int32)
+    
+    rng = random.Random(f"{seed}:{algorithm}:{cluster}")
+    solver = nearest_neighbor if algorithm == "NN" else best_insertion
+    return solver(coords, 1, "unspecified", False, rng = rng)[0].order
+
+def _stitch(points, cluster_tours, centroids, cluster_order):
+    '''
+    Joins circuits of clusters into one Hamiltonian circuit.
+    Clusters are visited in cluster_order, every circuit is opened at the node nearest to the last node
+    of the previous cluster and walked in the direction ending closer to the next cluster.
+
+        Parameters:
+            points (array): Coordinates of nodes, shape (n, 2).
+            cluster_tours (list): Arrays of indices of nodes of every cluster in order of its circuit.
+            centroids (array): Centroids of clusters.
+            cluster_order (list): Order in which the clusters are visited.
+
+        Returns:
+            order, junctions (tuple): Indices of nodes of the circuit and positions where clusters are joined.
+    '''
+    
+    paths = []
+    junctions = []
+    position = 0
+    previous = centroids[cluster_order[-1]]
+    
+    for i, cluster in enumerate(cluster_order):
+        tour = cluster_tours[cluster]
+        following = centroids[cluster_order[(i + 1) % len(cluster_order)]]
+        
+        # Enter the cluster at the node nearest to the previous cluster
+        entry = int(np.argmin(np.hypot(*(points[tour] - previous).T)))
+        path = np.roll(tour, -entry)
+        
+        # Walk the circuit backwards if its other neighbor of the entry node is closer to the next cluster
+        if len(path) > 2 and np.hypot(*(points[path[1]] - following)) < np.hypot(*(points[path[-1]] - following)):
+            path = np.concatenate((path[:1], path[:0:-1]))
+        
+        paths.append(path)
+        junctions.append(position)
+        position += len(path)
+        previous = points[path[-1]]
+        
+    return np.concatenate(paths), junctions
+
+def decompose(coords_list, clusters = None, method = "grid", algorithm = "BI", workers = None, seed = 0,
+              repair = None, cluster_size = 1000, repair_window = 50):
+    '''
+    Solves large instances by spatial decomposition. Nodes are partitioned into clusters, every cluster is solved
+    independently in parallel by NN or BI algorithm and the circuits of clusters are joined in order of a circuit
+    through centroids of the clusters. Optionally, the circuit is improved near the joints by 2-opt and Or-opt moves.
+
+        Parameters:
+            coords_list (list): List of coordinations of nodes.
+            clusters (int): Number of clusters. DEFAULT = None (number of nodes / cluster_size)
+            method (str): Partitioning of nodes. DEFAULT = "grid" (cells of a regular grid) OPTIONAL = "kmeans"
+            algorithm (str): Algorithm solving the clusters. DEFAULT = "BI" (Best Insertion) OPTIONAL = "NN" (Nearest Neighbor)
+            workers (int): Number of processes. DEFAULT = None (number of processors)
+            seed (int): Seed of the random number generators. DEFAULT = 0
+            repair (float): Time budget in seconds for improving the circuit near the joints of clusters.
+                            DEFAULT = None (no repair)
+            cluster_size (int): Average number of nodes of a cluster if clusters is not specified. DEFAULT = 1000
+            repair_window (int): Number of nodes on both sides of every joint evaluated by the repair. DEFAULT = 50
+
+        Returns:
+            tour, report (tuple): Hamiltonian circuit (see Tour) and dictionary describing the run
+                                  ("length", "nodes", "clusters", "seconds" of stages "partition", "solve",
+                                  "stitch", "repair" and "total", "repair_moves").
+    '''
+    
+    if method not in ("grid", "kmeans") or algorithm not in ("NN", "BI"):
         sys.exit("Unknown parameters. The script will now terminate.")
+    
+    seconds = {}
+    start = stage = time.perf_counter()
+    points = tour_points(coords_list)
+    clusters = clusters if clusters is not None else max(len(points) // cluster_size, 1)
+    
+    # Partition nodes and sort their indices by cluster
+    if method == "grid":
+        labels = grid_clusters(points, clusters)
+    else:
+        labels = kmeans_clusters(points, clusters, seed = seed)
+    
+    members = np.argsort(labels, kind = "stable").astype(np.int32)
+    bounds = np.cumsum(np.bincount(labels))
+    groups = np.split(members, bounds[:-1])
+    centroids = np.stack([points[group].mean(axis = 0) for group in groups])
+    seconds["partition"] = time.perf_counter() - stage
+    stage = time.perf_counter()
+    
+    # Solve clusters in parallel, every cluster has its own seed
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        futures = [executor.submit(_solve_cluster, algorithm, cluster, points[group].tolist(), seed)
+                   for cluster, group in enumerate(groups)]
+        cluster_tours = [group[future.result()] for group, future in zip(groups, futures)]
+    
+    seconds["solve"] = time.perf_counter() - stage
+    stage = time.perf_counter()
+    
+    # Visit clusters in order of a circuit through their centroids
+    if len(groups) >= 4:
+        cluster_order = best_insertion(centroids.tolist(), 1, "unspecified", False, rng = random.Random(seed))[0].order
+    else:
+        cluster_order = np.arange(len(groups))
+    
+    order, junctions = _stitch(points, cluster_tours, centroids, cluster_order)
+    seconds["stitch"] = time.perf_counter() - stage
+    stage = time.perf_counter()
+    moves = 0
+    
+    # Improve the circuit near the joints, nearest nodes are searched only among the nodes near the joints
+    if repair is not None and len(groups) > 1 and len(order) >= 5:
+        window = np.unique(np.concatenate([np.arange(position - repair_window, position + repair_window) % len(order)
+                                           for position in junctions]))
+        candidates = order[window].tolist()
+        local_neighbors = neighbor_lists(points[candidates].tolist())
+        neighbors = [[]] * len(order)
+        
+        for node, near in zip(candidates, local_neighbors):
+            neighbors[node] = [candidates[idx] for idx in near]
+        
+        search = _LocalSearch.from_order(points.tolist(), order.tolist(), neighbors)
+        search.run(candidates, max(repair - (time.perf_counter() - stage), 0))
+        moves = search.two_opt_moves + search.or_opt_moves
+        order = search.walk(int(order[0]))
+    
+    seconds["repair"] = time.perf_counter() - stage
+    tour = Tour(order, points)
+    seconds["total"] = time.perf_counter() - start
+    
+    report = {"length": tour.length, "nodes": len(points), "clusters": len(groups),
+              "seconds": seconds, "repair_moves": moves}
+    
+    return tour, report
+
+class IncrementalTour:
+    '''
+    Hamiltonian circuit updated by removing and adding nodes without solving the problem again.
+    The circuit is stored as a doubly linked list, so a node is removed in constant time.
+    Added nodes are inserted by the Best Insertion rule restricted to edges of their nearest nodes,
+    which are found by a k-d tree of the initial nodes and a scanned buffer of the added ones
+    (the tree is rebuilt when the buffer grows too large).
+
+        Parameters:
+            coords_list (list): List of coordinations of nodes.
+            tour (Tour or list): Tour or result [W, circuit] of nodes of coords_list.
+            k (int): Number of nearest nodes whose edges are evaluated for every added node. DEFAULT = 8
+    '''
+    
+    def __init__(self, coords_list, tour, k = 8):
+        order = circuit_indices(coords_list, tour if isinstance(tour, Tour) else tour[1])
+        self.k = k
+        self.coords = list(coords_list)
+        self.xs = [coord[0] for coord in coords_list]
+        self.ys = [coord[1] for coord in coords_list]
+        self.present = [False] * len(coords_list)
+        self.next = [-1] * len(coords_list)
+        self.prev = [-1] * len(coords_list)
+        self.head = order[0] if order else -1
+        self.count = len(order)
+        
+        # Nodes with equal coordinates are removed in order of their indices
+        self.by_coords = {}
+        for idx, coord in enumerate(coords_list):
+            self.by_coords.setdefault(tuple(coord[:2]), []).append(idx)
+        
+        for pos, node in enumerate(order):
+            self.present[node] = True
+            self.next[node] = order[(pos + 1) % len(order)]
+            self.prev[node] = order[pos - 1]
+        
+        self.length = tour.length if isinstance(tour, Tour) else float(tour[0])
+        self._rebuild()
+    
+    def __len__(self):
+        return self.count
+    
+    def _rebuild(self):
+        '''Builds the k-d tree of all nodes and removes the nodes which are not in the circuit.'''
+        self.tree = KDTree(list(zip(self.xs, self.ys)))
+        self.tree_size = len(self.xs)
+        self.buffer = []
+        self.buffer_xy = np.empty((0, 2))
+        
+        for idx, present in enumerate(self.present):
+            if not present:
+                self.tree.remove(idx)
+    
+    def dist(self, a, b):
+        return euclidean_dist(self.xs[a], self.ys[a], self.xs[b], self.ys[b])
+    
+    def nearest(self, x, y):
+        '''Finds k nearest nodes of the circuit to a point (list of (distance, index) pairs sorted by distance).'''
+        found = self.tree.nearest_k(x, y, self.k)
+        
+        if self.buffer:
+            dist = np.hypot(self.buffer_xy[:, 0] - x, self.buffer_xy[:, 1] - y)
+            dist[[not self.present[idx] for idx in self.buffer]] = inf
+            closest = np.argsort(dist)[:self.k]
+            found += [(float(dist[pos]), self.buffer[pos]) for pos in closest if dist[pos] < inf]
+            found.sort()
+            
+        return found[:self.k]
+    
+    def remove(self, coord):
+        '''
+        Removes a node with given coordinates from the circuit. Raises ValueError if there is no such node.
+
+            Parameters:
+                coord (list): Coordinates of the node.
+
+            Returns:
+                neighbors (tuple): Nodes joined by the removal (empty if the circuit is empty).
+        '''
+        
+        candidates = [idx for idx in self.by_coords.get(tuple(coord[:2]), []) if self.present[idx]]
+        
+        if not candidates:
+            raise ValueError(f"Node {coord} is not in the circuit.")
+        
+        node = candidates[0]
+        p, n = self.prev[node], self.next[node]
+        
+        # Join the neighbors of the removed node
+        self.length += self.dist(p, n) - self.dist(p, node) - self.dist(node, n)
+        self.next[p], self.prev[n] = n, p
+        self.present[node] = False
+        self.count -= 1
+        
+        if self.head == node:
+            self.head = n if self.count else -1
+        
+        # Avoid rounding errors accumulated in the length of an empty circuit
+        if not self.count:
+            self.length = 0.0
+        
+        if node < self.tree_size:
+            self.tree.remove(node)
+            
+        return (p, n) if self.count else ()
+    
+    def add(self, coord):
+        '''
+        Inserts a node into the edge of one of its nearest nodes with the minimum length increment.
+
+            Parameters:
+                coord (list): Coordinates of the node.
+
+            Returns:
+                node (int): Index of the added node.
+        '''
+        
+        u = len(self.xs)
+        self.coords.append(coord)
+        self.xs.append(coord[0])
+        self.ys.append(coord[1])
+        self.by_coords.setdefault(tuple(coord[:2]), []).append(u)
+        
+        # The first node forms a circuit with itself
+        if self.count == 0:
+            ui, uj, delta_w = u, u, 0
+        
+        # Evaluate both edges of the nearest nodes, length increment as in best_insertion
+        else:
+            delta_w = inf
+            
+            for _, v in self.nearest(coord[0], coord[1]):
+                for a, b in ((self.prev[v], v), (v, self.next[v])):
+                    delta = self.dist(a, u) + self.dist(u, b) - self.dist(a, b)
+                    
+                    if delta < delta_w:
+                        delta_w, ui, uj = delta, a, b
+        
+        self.next.append(uj)
+        self.prev.append(ui)
+        self.next[ui], self.prev[uj] = u, u
+        self.present.append(True)
+        self.length += delta_w
+        self.count += 1
+        self.head = self.head if self.head >= 0 else u
+        
+        # Added nodes are scanned until the tree is rebuilt
+        self.buffer.append(u)
+        self.buffer_xy = np.vstack((self.buffer_xy, [coord[:2]]))
+        
+        if len(self.buffer) > max(1024, self.tree_size // 64):
+            self._rebuild()
+            
+        return u
+    
+    def walk(self):
+        '''Returns indices of nodes in order of the circuit starting at the head.'''
+        order = []
+        node = self.head
+        
+        for _ in range(self.count):
+            order.append(node)
+            node = self.next[node]
+            
+        return order
+    
+    def repair(self, active, time_budget, or_opt = True):
+        '''
+        Improves the circuit by 2-opt and Or-opt moves (see _LocalSearch) applied directly to the linked list,
+        starting at given nodes. Nearest nodes are found only for the evaluated nodes when they are needed.
+
+            Parameters:
+                active (list): Nodes evaluated first, usually the nodes near the changes.
+                time_budget (float): Maximum time in seconds.
+                or_opt (bool): Specifies whether to apply Or-opt moves. DEFAULT = True
+
+            Returns:
+                moves (int): Number of applied moves.
+        '''
+        
+        cache = {}
+        
+        def neighbors(node):
+            if node not in cache:
+                cache[node] = [idx for _, idx in self.nearest(self.xs[node], self.ys[node]) if idx != node]
+            return cache[node]
+        
+        search = _LocalSearch(self.xs, self.ys, self.next, self.prev, self.count, neighbors)
+        search.run([node for node in active if self.present[node]], time_budget, or_opt)
+        self.length -= search.gain
+        return search.two_opt_moves + search.or_opt_moves
+    
+    def update(self, added = (), removed = (), repair = None):
+        '''
+        Removes and adds nodes and optionally improves the circuit near the changes.
+        Raises ValueError without changing the circuit if a removed node is not in it.
+
+            Parameters:
+                added (list): Coordinates of added nodes. DEFAULT = ()
+                removed (list): Coordinates of removed nodes. DEFAULT = ()
+                repair (float): Time budget in seconds for improving the circuit near the changes.
+                                DEFAULT = None (no repair)
+
+            Returns:
+                report (dict): "added", "removed", "nodes", "length", "repair_moves" and "seconds".
+        '''
+        
+        start = time.perf_counter()
+        changed = []
+        
+        # Check all removed nodes first, so an invalid update does not leave the circuit half updated
+        requested = {}
+        for coord in removed:
+            key = tuple(coord[:2])
+            requested[key] = requested.get(key, 0) + 1
+            
+            if requested[key] > sum(self.present[idx] for idx in self.by_coords.get(key, [])):
+                raise ValueError(f"Node {coord} is not in the circuit.")
+        
+        for coord in removed:
+            changed.extend(self.remove(coord))
+            
+        for coord in added:
+            u = self.add(coord)
+            changed.extend((self.prev[u], u, self.next[u]))
+        
+        moves = self.repair(changed, repair) if repair is not None else 0
+        
+        return {"added": len(added), "removed": len(removed), "nodes": self.count, "length": self.length,
+                "repair_moves": moves, "seconds": time.perf_counter() - start}
+    
+    def result(self):
+        '''
+        Returns the current nodes and the circuit.
 
-# Load coordinates
-coords = load_coordinates("villages_zemplin_sjtsk.json")
+            Returns:
+                coords_list, tour (tuple): List of coordinates of nodes of the circuit (in order of their addition)
+                                           and the circuit (see Tour).
+        '''
+        
+        nodes = [idx for idx, present in enumerate(self.present) if present]
+        index = {node: pos for pos, node in enumerate(nodes)}
+        coords_list = [self.coords[node] for node in nodes]
+        order = [index[node] for node in self.walk()]
+        return coords_list, Tour(order, tour_points(coords_list) if coords_list else np.empty((0, 2)), self.length)
+
+def update_tour(coords_list, tour, added = (), removed = (), repair = None, k = 8):
+    '''
+    Updates a Hamiltonian circuit after nodes were added or removed (see IncrementalTour).
+    For repeated updates of the same circuit, keep an IncrementalTour, so its k-d tree is built only once.
 
-# Save results of TSP with (un)specified arguments
-tsp = TSP(coords, starting_node=7)
\ No newline at end of file
+        Parameters:
+            coords_list (list): List of coordinations of nodes.
+            tour (Tour or list): Tour or result [W, circuit] of nodes of coords_list.
+            added (list): Coordinates of added nodes. DEFAULT = ()
+            removed (list): Coordinates of removed nodes. DEFAULT = ()
+            repair (float): Time budget in seconds for improving the circuit near the changes. DEFAULT = None (no repair)
+            k (int): Number of nearest nodes whose edges are evaluated for every added node. DEFAULT = 8
+
+        Returns:
+            coords_list, tour, report (tuple): Updated list of coordinates, circuit of its nodes (see Tour)
+                                               and dictionary describing the update (see IncrementalTour.update).
+    '''
+    
+    incremental = IncrementalTour(coords_list, tour, k)
+    report = incremental.update(added, removed, repair)
+    return (*incremental.result(), report)
+
+if __name__ == "__main__":
+    
+    # Load coordinates
+    coords = load_coordinates_array("villages_zemplin_sjtsk.json").tolist()
+    
+    # Save results of TSP with (un)specified arguments
+    tsp = TSP(coords, starting_node=7)
\ No newline at end of file